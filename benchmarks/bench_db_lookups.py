@@ -0,0 +1,133 @@
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from database.db_config import settings  # noqa: E402
+from database.migrations import MIGRATIONS  # noqa: E402
+from database.models import Film, Rating, User  # noqa: E402
+
+# Бенчмарк поиска пользователя по tg_id, фильма по ссылке и оценки по паре
+# (пользователь, фильм) на таблицах разного размера. Данные создаются
+# в отдельной схеме, которая удаляется после замеров
+BENCH_SCHEMA = 'bench_lookups'
+# Индексы для этих запросов добавляют первые две миграции
+BENCH_SCHEMA_VERSION = 2
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+DEFAULT_QUERIES = 2000
+
+LOOKUPS = {
+    'users.tg_id': lambda i: select(User.id).filter_by(tg_id=10 ** 10 + i),
+    'films.wiki_link': lambda i: select(Film.id).filter_by(
+        wiki_link=f'https://ru.wikipedia.org/wiki/Film_{i}'),
+    'ratings(user_id, film_id)': lambda i: select(Rating.id).filter_by(
+        user_id=i, film_id=i),
+}
+
+
+async def _create_schema(conn: AsyncConnection) -> None:
+    await conn.execute(text(f'DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE'))
+    await conn.execute(text(f'CREATE SCHEMA {BENCH_SCHEMA}'))
+    for version, _, statements in MIGRATIONS:
+        if version > BENCH_SCHEMA_VERSION:
+            break
+        for statement in statements:
+            await conn.execute(text(statement))
+
+
+# Номера строк, которые добавляются при дополнении таблиц
+SERIES = 'generate_series(CAST(:start AS int), CAST(:size AS int)) AS i'
+
+
+# Функция, дополняющая таблицы до size строк
+async def _fill(conn: AsyncConnection, start: int, size: int) -> None:
+    params = {'start': start + 1, 'size': size}
+    await conn.execute(text(
+        'INSERT INTO users (tg_id, user_name) '
+        f"SELECT 10000000000 + i, 'user ' || i FROM {SERIES}"), params)
+    await conn.execute(text(
+        'INSERT INTO films (title, wiki_link) '
+        "SELECT 'Film ' || i, 'https://ru.wikipedia.org/wiki/Film_' || i "
+        f'FROM {SERIES}'), params)
+    await conn.execute(text(
+        'INSERT INTO ratings (user_id, film_id, rating) '
+        f'SELECT i, i, i % 11 FROM {SERIES}'), params)
+    await conn.execute(text('ANALYZE users, films, ratings'))
+
+
+# Функция, возвращающая среднее время и 95-й перцентиль запроса в мкс
+async def _measure(conn: AsyncConnection, make_stmt, size: int,
+                   queries: int) -> tuple[float, float]:
+    timings = []
+    for _ in range(queries):
+        stmt = make_stmt(random.randint(1, size))
+        started = time.perf_counter()
+        await conn.scalar(stmt)
+        timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    return statistics.fmean(timings), timings[int(len(timings) * 0.95)]
+
+
+async def _report(conn: AsyncConnection, label: str, size: int,
+                  queries: int) -> None:
+    for name, make_stmt in LOOKUPS.items():
+        mean, p95 = await _measure(conn, make_stmt, size, queries)
+        print(f'{label:>12} {size:>10} {name:<26} '
+              f'mean {mean:8.0f} us   p95 {p95:8.0f} us')
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Measure indexed lookups on growing tables')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--queries', type=int, default=DEFAULT_QUERIES)
+    parser.add_argument('--skip-unindexed', action='store_true',
+                        help='do not measure the largest size without indexes')
+    args = parser.parse_args()
+
+    engine = create_async_engine(
+        settings.DATABASE_URL_psycopg,
+        connect_args={'options': f'-c search_path={BENCH_SCHEMA}'})
+    try:
+        async with engine.connect() as conn:
+            await _create_schema(conn)
+            await conn.commit()
+
+            filled = 0
+            for size in sorted(args.sizes):
+                await _fill(conn, filled, size)
+                await conn.commit()
+                filled = size
+                await _report(conn, 'indexed', size, args.queries)
+
+            # Для сравнения: те же запросы на самой большой таблице
+            # без индексов, как было до миграций
+            if not args.skip_unindexed:
+                await conn.execute(text(
+                    'ALTER TABLE users DROP CONSTRAINT users_tg_id_key'))
+                await conn.execute(text(
+                    'ALTER TABLE ratings '
+                    'DROP CONSTRAINT uq_ratings_user_film'))
+                await conn.execute(text('DROP INDEX ix_films_wiki_link'))
+                await conn.execute(text('DROP INDEX ix_ratings_user_rating'))
+                await conn.commit()
+                await _report(conn, 'no index', filled,
+                              max(args.queries // 100, 10))
+
+            await conn.execute(text(f'DROP SCHEMA {BENCH_SCHEMA} CASCADE'))
+            await conn.commit()
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
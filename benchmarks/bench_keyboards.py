@@ -0,0 +1,70 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from keyboards.keyboards import (KEYBOARDS, STATIC_KEYBOARDS,  # noqa: E402
+                                 MyFilmsMenu, TopMenu)
+
+# Бенчмарк создания клавиатур: время и память, которые выделяются на
+# один вызов, когда клавиатура берется из кэша и когда строится заново,
+# как до кэширования. Функция без кэша доступна через __wrapped__
+DEFAULT_CALLS = 20_000
+FILMS_PAGE = tuple((film_id, f'Фильм {film_id}', film_id % 11)
+                   for film_id in range(1, 11))
+TOP_WINDOWS = (7, 30, 0)
+
+CASES = {
+    **{kb_id: (KEYBOARDS[kb_id], ()) for kb_id in STATIC_KEYBOARDS},
+    'all_my_films_menu': (MyFilmsMenu._create_all_my_films_menu_kb,
+                          (FILMS_PAGE, True, True)),
+    'top_menu': (TopMenu.create_top_menu_kb, (False, 7, TOP_WINDOWS)),
+}
+
+
+# Функция, возвращающая время вызова в мкс и выделенную память в байтах
+# на один вызов
+def _measure(factory, args: tuple, calls: int) -> tuple[float, float]:
+    factory(*args)
+    started = time.perf_counter()
+    for _ in range(calls):
+        factory(*args)
+    elapsed = time.perf_counter() - started
+
+    # Память считается отдельно: tracemalloc замедляет выполнение
+    sample = max(calls // 10, 1)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    allocated = 0
+    for _ in range(sample):
+        factory(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += peak - before
+        tracemalloc.reset_peak()
+    tracemalloc.stop()
+    return elapsed / calls * 1e6, allocated / sample
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Measure keyboard creation with and without caching')
+    parser.add_argument('--calls', type=int, default=DEFAULT_CALLS)
+    args = parser.parse_args()
+
+    print(f'{"keyboard":<20} {"uncached":>22} {"cached":>22}')
+    for name, (factory, factory_args) in CASES.items():
+        uncached = _measure(factory.__wrapped__, factory_args,
+                            max(args.calls // 10, 1))
+        cached = _measure(factory, factory_args, args.calls)
+        print(f'{name:<20} '
+              f'{uncached[0]:7.1f} us {uncached[1]:9.0f} B   '
+              f'{cached[0]:7.2f} us {cached[1]:9.0f} B')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import difflib
+import os
+import random
+import statistics
+import string
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from services.similarity import TitleMatcher  # noqa: E402
+
+# Бенчмарк отбора результатов поиска: прежний цикл с
+# difflib.SequenceMatcher против TitleMatcher на списках названий
+# разной длины. Для каждого размера выводится время на один запрос,
+# время построения индекса TitleMatcher, число названий, прошедших
+# порог каждым способом, и доля совпадающих отборов (мера Жаккара).
+# Оба способа проверяются на одних и тех же запросах
+DEFAULT_SIZES = (10, 50, 500, 5000)
+DEFAULT_QUERIES = 200
+DIFFLIB_THRESHOLD = 0.9
+MATCHER_THRESHOLD = 0.78
+WORDS = ('Война', 'мир', 'Сталкер', 'Солярис', 'зеркало', 'ночь', 'город',
+         'брат', 'служебный', 'роман', 'ирония', 'судьбы', 'белое', 'солнце',
+         'пустыни', 'двенадцать', 'стульев', 'кавказская', 'пленница')
+
+
+def _make_title(rng: random.Random) -> str:
+    words = ' '.join(rng.choices(WORDS, k=rng.randint(1, 4)))
+    return f'{words} (фильм, {rng.randint(1930, 2024)})'
+
+
+# Функция, делающая в названии одну опечатку
+def _typo(title: str, rng: random.Random) -> str:
+    position = rng.randrange(len(title))
+    return (title[:position] + rng.choice(string.ascii_lowercase)
+            + title[position + 1:])
+
+
+def _difflib_matches(query: str, titles: list[str]) -> set[str]:
+    query_lower = query.lower()
+    return {title for title in titles
+            if difflib.SequenceMatcher(
+                None, query_lower, title.lower()).ratio() > DIFFLIB_THRESHOLD}
+
+
+def _matcher_matches(query: str, matcher: TitleMatcher) -> set[str]:
+    return {matcher.titles[index] for index, _ in matcher.top(
+        query, len(matcher.titles), min_score=MATCHER_THRESHOLD)}
+
+
+# Функция, возвращающая отборы для каждого запроса
+# и среднее время на запрос в мкс
+def _measure(match, queries: list[str],
+             candidates) -> tuple[list[set[str]], float]:
+    timings = []
+    matched = []
+    for query in queries:
+        started = time.perf_counter()
+        matched.append(match(query, candidates))
+        timings.append((time.perf_counter() - started) * 1e6)
+    return matched, statistics.fmean(timings)
+
+
+def _agreement(first: set[str], second: set[str]) -> float:
+    union = first | second
+    return len(first & second) / len(union) if union else 1.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Compare difflib and TitleMatcher on search results')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--queries', type=int, default=DEFAULT_QUERIES)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for size in args.sizes:
+        titles = [_make_title(rng) for _ in range(size)]
+        # На больших списках difflib слишком медленный для всех запросов,
+        # поэтому число запросов уменьшается для обоих способов
+        queries = [_typo(rng.choice(titles), rng)
+                   for _ in range(max(args.queries * 50 // size, 5)
+                                  if size > 50 else args.queries)]
+        started = time.perf_counter()
+        matcher = TitleMatcher(titles)
+        build = (time.perf_counter() - started) * 1e3
+        difflib_matched, difflib_time = _measure(
+            _difflib_matches, queries, titles)
+        matcher_matched, matcher_time = _measure(
+            _matcher_matches, queries, matcher)
+        agreement = statistics.fmean(
+            _agreement(first, second)
+            for first, second in zip(difflib_matched, matcher_matched))
+        print(f'{size:>6} titles, {len(queries)} queries: '
+              f'difflib {difflib_time:9.0f} us/query, '
+              f'TitleMatcher {matcher_time:7.0f} us/query '
+              f'(index {build:.1f} ms), matched '
+              f'{statistics.fmean(map(len, difflib_matched)):.2f} / '
+              f'{statistics.fmean(map(len, matcher_matched)):.2f}, '
+              f'agreement {agreement:.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+from aiohttp import ClientSession, web
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from aiogram import Bot, Dispatcher, Router  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiogram.types import Message  # noqa: E402
+
+from config_data.config import WebhookConfig  # noqa: E402
+from middlewares.scheduler import UpdateSchedulerMiddleware  # noqa: E402
+from states.storage import (ChatEventIsolation,  # noqa: E402
+                            JsonMemoryStorage)
+from webhook.webhook import create_app  # noqa: E402
+
+# Нагрузочный стенд для вебхука: поддельный Bot API отвечает на запросы
+# бота с заданной задержкой, а клиенты шлют апдейты на вебхук так же,
+# как Telegram, держа не больше --connections запросов одновременно.
+# Хэндлер отвечает на каждое сообщение, поэтому каждый апдейт
+# проходит путь вебхук -> диспетчер -> хэндлер -> Bot API
+BOT_TOKEN = '42:benchmark'
+SECRET = 'benchmark-secret'
+WEBHOOK_PATH = '/webhook'
+API_PORT = 18081
+WEBHOOK_PORT = 18080
+
+router = Router()
+
+
+@router.message()
+async def echo_handler(message: Message, handler_delay: float):
+    # Имитация работы хэндлера, например запроса к базе данных
+    await asyncio.sleep(handler_delay)
+    await message.answer(text=message.text)
+
+
+# Функция, создающая поддельный Bot API. На любой метод отвечает
+# сообщением, чего достаточно для sendMessage
+def create_fake_api(delay: float) -> web.Application:
+    async def api_handler(request: web.Request) -> web.Response:
+        await asyncio.sleep(delay)
+        return web.json_response({'ok': True, 'result': {
+            'message_id': 1, 'date': 0, 'text': 'ok',
+            'chat': {'id': 1, 'type': 'private'}}})
+
+    app = web.Application()
+    app.router.add_post('/bot{token}/{method}', api_handler)
+    return app
+
+
+def _make_update(update_id: int, chat_id: int) -> dict:
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': int(time.time()),
+        'chat': {'id': chat_id, 'type': 'private'},
+        'from': {'id': chat_id, 'is_bot': False, 'first_name': 'User'},
+        'text': f'update {update_id}'}}
+
+
+# Функция, отправляющая апдейты на вебхук. Апдейты, на которые сервер
+# ответил 503, отправляются повторно, как это делает Telegram
+async def _send_updates(args: argparse.Namespace) -> None:
+    url = f'http://127.0.0.1:{WEBHOOK_PORT}{WEBHOOK_PATH}'
+    headers = {'X-Telegram-Bot-Api-Secret-Token': SECRET}
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for update_id in range(1, args.updates + 1):
+        queue.put_nowait(update_id)
+    latencies: list[float] = []
+    rejected = 0
+
+    async def client(session: ClientSession) -> None:
+        nonlocal rejected
+        while not queue.empty():
+            update_id = queue.get_nowait()
+            update = _make_update(update_id, update_id % args.chats + 1)
+            started = time.perf_counter()
+            async with session.post(url, json=update,
+                                    headers=headers) as response:
+                await response.read()
+            if response.status == 503:
+                rejected += 1
+                queue.put_nowait(update_id)
+                await asyncio.sleep(0.01)
+                continue
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    async with ClientSession() as session:
+        await asyncio.gather(*(client(session)
+                               for _ in range(args.connections)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f'updates: {len(latencies)}, chats: {args.chats}, '
+          f'connections: {args.connections}')
+    print(f'throughput: {len(latencies) / elapsed:.0f} updates/s, '
+          f'503 responses: {rejected}')
+    print(f'latency ms: p50 {statistics.median(latencies):.1f}, '
+          f'p95 {latencies[int(len(latencies) * 0.95)]:.1f}, '
+          f'max {latencies[-1]:.1f}')
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Measure webhook throughput against a fake Bot API')
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--chats', type=int, default=500)
+    parser.add_argument('--connections', type=int, default=40,
+                        help='parallel connections, as max_connections')
+    parser.add_argument('--max-in-flight', type=int, default=100)
+    parser.add_argument('--max-concurrency', type=int, default=50)
+    parser.add_argument('--max-pending', type=int, default=1000)
+    parser.add_argument('--api-delay', type=float, default=0.02,
+                        help='fake Bot API response time in seconds')
+    parser.add_argument('--handler-delay', type=float, default=0.005)
+    args = parser.parse_args()
+
+    api_runner = web.AppRunner(create_fake_api(args.api_delay))
+    await api_runner.setup()
+    await web.TCPSite(api_runner, '127.0.0.1', API_PORT).start()
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(
+        f'http://127.0.0.1:{API_PORT}'))
+    bot = Bot(token=BOT_TOKEN, session=session)
+    # Middleware подключаются в том же порядке, что и в bot.py
+    dp = Dispatcher(storage=JsonMemoryStorage(),
+                    events_isolation=ChatEventIsolation(), disable_fsm=True)
+    dp['handler_delay'] = args.handler_delay
+    scheduler = UpdateSchedulerMiddleware(
+        max_concurrency=args.max_concurrency,
+        max_pending=args.max_pending)
+    dp.update.outer_middleware(scheduler)
+    dp.update.outer_middleware(dp.fsm)
+    dp.update.outer_middleware(scheduler.limit)
+    dp.include_router(router)
+
+    config = WebhookConfig(
+        enabled=True, base_url=None, path=WEBHOOK_PATH, secret=SECRET,
+        host='127.0.0.1', port=WEBHOOK_PORT,
+        max_connections=args.connections, max_in_flight=args.max_in_flight)
+    runner = web.AppRunner(create_app(dp, bot, config))
+    await runner.setup()
+    await web.TCPSite(runner, config.host, config.port).start()
+    try:
+        await _send_updates(args)
+    finally:
+        await runner.cleanup()
+        await session.close()
+        await api_runner.cleanup()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
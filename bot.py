@@ -5,9 +5,22 @@ import sys
 
 from aiogram import Bot, Dispatcher
 from config_data.config import load_config, Config
-from handlers import other_handlers, user_handlers  # , admin_handlers
-from keyboards.keyboards import set_default_main_menu
-from database.orm import TableORM
+from config_data.logging_config import setup_logging
+from handlers import (library_handlers, other_handlers, top_handlers,
+                      user_handlers)  # , admin_handlers
+from keyboards.keyboards import build_static_keyboards, set_default_main_menu
+from middlewares.log_context import LogContextMiddleware
+from middlewares.metrics import (HandlerMetricsMiddleware,
+                                 UpdateMetricsMiddleware)
+from middlewares.scheduler import UpdateSchedulerMiddleware
+from metrics.metrics import start_metrics_server
+from database.migrations import MigrationORM
+from database.database import async_engine
+from services.http_client import HttpClient
+from services.leaderboard import Leaderboards
+from services.rating_buffer import rating_buffer
+from states.storage import create_events_isolation, create_storage
+from webhook.webhook import run_webhook
 
 sys.path.insert(1, os.path.join(sys.path[0], '..'))
 
@@ -18,39 +31,108 @@ logger = logging.getLogger(__name__)
 
 # Функция конфигурирования и запуска бота
 async def main():
-    # Создаем таблицы
-    TableORM.create_tables()
+    # Загружаем конфиг
+    config: Config = load_config()
 
     # Конфигурируем логгирование
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(filename)s:%(lineno)d #%(levelname)-8s '
-               '[%(asctime)s] - %(name)s - %(message)s'
-    )
+    log_listener = setup_logging(config.logging)
+    try:
+        await run_bot(config)
+    finally:
+        # Дописываем оставшиеся в очереди записи лога
+        log_listener.stop()
 
+
+# Функция запуска бота
+async def run_bot(config: Config):
     # Выводим в консоль информацию о начале запуска бота
     logger.info('Starting bot')
 
-    # Загружаем конфиг
-    config: Config = load_config()
+    # Применяем недостающие миграции схемы базы данных
+    schema_version = await MigrationORM.migrate()
+    logger.info('Database schema version: %d', schema_version)
 
     # Инициализируем бот и диспетчер
     bot = Bot(
         token=config.tg_bot.token,
         parse_mode='HTML')
-    dp = Dispatcher()
+    storage = create_storage(config.storage)
+    # FSM-middleware регистрируется ниже вручную, чтобы планировщик
+    # учитывал апдейты, которые ждут своей очереди в чате
+    dp = Dispatcher(
+        storage=storage,
+        events_isolation=create_events_isolation(config.storage, storage),
+        disable_fsm=True)
+
+    # Заранее создаем клавиатуры, которые не зависят от аргументов
+    build_static_keyboards()
 
     # Настраиваем дефолтное главное меню бота
     await set_default_main_menu(bot)
 
+    # Добавляем данные апдейта в записи лога
+    dp.update.outer_middleware(LogContextMiddleware())
+
+    # Регистрируем планировщик обработки апдейтов. Лишние апдейты
+    # отбрасываются до того, как встанут в очередь чата
+    scheduler = UpdateSchedulerMiddleware(
+        max_concurrency=config.scheduler.max_concurrency,
+        max_pending=config.scheduler.max_pending)
+    dp.update.outer_middleware(scheduler)
+    # FSM-middleware дожидается очереди апдейта в чате
+    # и только после этого читает состояние пользователя
+    dp.update.outer_middleware(dp.fsm)
+
+    # Регистрируем сбор метрик апдейтов и хэндлеров.
+    # Время апдейта включает ожидание общего слота планировщика
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
+
+    # Ограничиваем количество одновременно обрабатываемых апдейтов
+    dp.update.outer_middleware(scheduler.limit)
+
     # Регистрируем роутеры в диспетчере
+    dp.include_router(library_handlers.router)
+    dp.include_router(top_handlers.router)
     dp.include_router(user_handlers.router)
     # dp.include_router(admin_handlers.router)
     dp.include_router(other_handlers.router)
 
-    # Пропускаем накопившиеся апдейты и запускаем polling
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    # Запускаем сервер с метриками
+    if config.metrics.enabled:
+        metrics_runner = await start_metrics_server(config.metrics.host,
+                                                    config.metrics.port)
+        dp.shutdown.register(metrics_runner.cleanup)
+
+    # Запускаем отложенную запись оценок и записываем
+    # оставшиеся оценки при остановке бота
+    dp.startup.register(rating_buffer.start)
+    dp.shutdown.register(rating_buffer.stop)
+
+    # Списки /top пересчитываются в фоне и передаются в хэндлеры
+    leaderboards = Leaderboards(
+        windows=config.leaderboard.windows,
+        size=config.leaderboard.size,
+        min_ratings=config.leaderboard.min_ratings,
+        refresh_interval=config.leaderboard.refresh_interval)
+    dp['leaderboards'] = leaderboards
+    dp.startup.register(leaderboards.start)
+    dp.shutdown.register(leaderboards.stop)
+
+    # Закрываем общий HTTP-клиент при остановке бота
+    dp.shutdown.register(HttpClient.close)
+    # Закрываем пул соединений с базой данных при остановке бота
+    dp.shutdown.register(async_engine.dispose)
+    # Соединение с FSM-хранилищем закрывает сам диспетчер при остановке
+
+    if config.webhook.enabled:
+        # Запускаем сервер для приема апдейтов через вебхук
+        await run_webhook(dp, bot, config.webhook)
+    else:
+        # Пропускаем накопившиеся апдейты и запускаем polling
+        await bot.delete_webhook(drop_pending_updates=True)
+        await dp.start_polling(bot)
 
 
 if __name__ == '__main__':
@@ -9,9 +9,81 @@ class TgBot:
     # admin_ids: list[int]  # Список id администраторов бота
 
 
+@dataclass
+class FSMStorageConfig:
+    backend: str                 # Хранилище состояний: memory или redis
+    redis_url: str | None        # Адрес Redis для хранилища redis
+    state_ttl: int | None        # Время жизни состояний в секундах
+    data_ttl: int | None         # Время жизни данных состояний в секундах
+
+
+@dataclass
+class WebhookConfig:
+    enabled: bool                # Режим работы: вебхук вместо polling
+    base_url: str | None         # Внешний адрес сервера с вебхуком
+    path: str                    # Путь, на который Telegram шлет апдейты
+    secret: str | None           # Секрет для проверки запросов от Telegram
+    host: str                    # Адрес, на котором слушает сервер
+    port: int                    # Порт, на котором слушает сервер
+    max_connections: int         # Максимум соединений со стороны Telegram
+    max_in_flight: int           # Лимит одновременных запросов к серверу
+
+
+# Апдейты сверх max_pending не ставятся в очередь, а отбрасываются
+# безвозвратно: Telegram уже считает их доставленными. На сообщения
+# и нажатия кнопок бот отвечает, что перегружен, остальные апдейты
+# только учитываются в логе и метрике bot_updates_dropped_total
+@dataclass
+class SchedulerConfig:
+    max_concurrency: int         # Максимум апдейтов в обработке
+    max_pending: int             # Максимум апдейтов в очереди на обработку
+
+
+@dataclass
+class MetricsConfig:
+    enabled: bool                # Запускать ли сервер с метриками
+    host: str                    # Адрес сервера с метриками
+    port: int                    # Порт сервера с метриками
+
+
+@dataclass
+class LoggingConfig:
+    level: str                   # Уровень логирования по умолчанию
+    module_levels: dict          # Уровни логирования для отдельных модулей
+    json: bool                   # Писать логи в формате JSON
+    debug_sample_rate: float     # Доля DEBUG-записей, которые попадут в лог
+
+
+@dataclass
+class LeaderboardConfig:
+    windows: list[int]           # Окна списков /top в днях (0 - за все время)
+    size: int                    # Количество фильмов в списке
+    min_ratings: int             # Минимум оценок для списка лучших фильмов
+    refresh_interval: float      # Интервал пересчета списков в секундах
+
+
 @dataclass
 class Config:
     tg_bot: TgBot
+    storage: FSMStorageConfig
+    webhook: WebhookConfig
+    scheduler: SchedulerConfig
+    metrics: MetricsConfig
+    logging: LoggingConfig
+    leaderboard: LeaderboardConfig
+
+
+# Функция, проверяющая, что для режима вебхука заданы адрес и секрет.
+# Без адреса Telegram получил бы некорректный URL, а без секрета сервер
+# принимал бы апдейты от кого угодно
+def _validate_webhook(config: WebhookConfig) -> None:
+    if not config.enabled:
+        return
+    missing = [name for name, value in (('WEBHOOK_BASE_URL', config.base_url),
+                                        ('WEBHOOK_SECRET', config.secret))
+               if not value]
+    if missing:
+        raise ValueError('BOT_MODE=webhook requires ' + ', '.join(missing))
 
 
 # Создаем функция, которая будет читать файл .env и возвращать
@@ -19,7 +91,47 @@ class Config:
 def load_config(path: str | None = None) -> Config:
     env = Env()
     env.read_env(path)
-    return Config(tg_bot=TgBot(
-        token=env('BOT_TOKEN'),
-        # admin_ids=env('ADMIN_IDS')
-    ))
+    config = Config(
+        tg_bot=TgBot(
+            token=env('BOT_TOKEN'),
+            # admin_ids=env('ADMIN_IDS')
+        ),
+        storage=FSMStorageConfig(
+            backend=env('FSM_STORAGE', 'memory'),
+            redis_url=env('REDIS_URL', None),
+            state_ttl=env.int('FSM_STATE_TTL', None),
+            data_ttl=env.int('FSM_DATA_TTL', None)
+        ),
+        webhook=WebhookConfig(
+            enabled=env('BOT_MODE', 'polling') == 'webhook',
+            base_url=env('WEBHOOK_BASE_URL', None),
+            path=env('WEBHOOK_PATH', '/webhook'),
+            secret=env('WEBHOOK_SECRET', None),
+            host=env('WEB_SERVER_HOST', '0.0.0.0'),
+            port=env.int('WEB_SERVER_PORT', 8080),
+            max_connections=env.int('WEBHOOK_MAX_CONNECTIONS', 40),
+            max_in_flight=env.int('WEB_SERVER_MAX_IN_FLIGHT', 100)
+        ),
+        scheduler=SchedulerConfig(
+            max_concurrency=env.int('UPDATES_MAX_CONCURRENCY', 50),
+            max_pending=env.int('UPDATES_MAX_PENDING', 1000)
+        ),
+        metrics=MetricsConfig(
+            enabled=env.bool('METRICS_ENABLED', True),
+            host=env('METRICS_HOST', '127.0.0.1'),
+            port=env.int('METRICS_PORT', 9100)
+        ),
+        logging=LoggingConfig(
+            level=env('LOG_LEVEL', 'INFO'),
+            module_levels=env.dict('LOG_LEVELS', {}),
+            json=env.bool('LOG_JSON', False),
+            debug_sample_rate=env.float('LOG_DEBUG_SAMPLE_RATE', 1.0)
+        ),
+        leaderboard=LeaderboardConfig(
+            windows=env.list('TOP_WINDOWS', [7, 30, 0], subcast=int),
+            size=env.int('TOP_SIZE', 10),
+            min_ratings=env.int('TOP_MIN_RATINGS', 3),
+            refresh_interval=env.float('TOP_REFRESH_INTERVAL', 300)
+        ))
+    _validate_webhook(config.webhook)
+    return config
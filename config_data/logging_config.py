@@ -0,0 +1,82 @@
+import json
+import logging
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+from config_data.config import LoggingConfig
+
+# Данные текущего апдейта, которые добавляются в каждую запись лога
+update_id_var: ContextVar[int | None] = ContextVar('update_id', default=None)
+chat_id_var: ContextVar[int | None] = ContextVar('chat_id', default=None)
+user_id_var: ContextVar[int | None] = ContextVar('user_id', default=None)
+
+TEXT_FORMAT = ('%(filename)s:%(lineno)d #%(levelname)-8s '
+               '[%(asctime)s] - %(name)s - %(message)s')
+
+
+# Фильтр, добавляющий в запись данные текущего апдейта
+class ContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.update_id = update_id_var.get()
+        record.chat_id = chat_id_var.get()
+        record.user_id = user_id_var.get()
+        return True
+
+
+# Фильтр, пропускающий только часть DEBUG-записей
+class DebugSamplingFilter(logging.Filter):
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+# Форматтер, записывающий каждую запись одной строкой JSON
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'update_id': getattr(record, 'update_id', None),
+            'chat_id': getattr(record, 'chat_id', None),
+            'user_id': getattr(record, 'user_id', None),
+        }
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+# Функция, настраивающая логирование. Записи передаются через очередь
+# в отдельный поток, который пишет их в stderr, поэтому event loop
+# не блокируется на вводе-выводе. Возвращает запущенный QueueListener,
+# который нужно остановить при завершении работы
+def setup_logging(config: LoggingConfig) -> QueueListener:
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(
+        JsonFormatter() if config.json else logging.Formatter(TEXT_FORMAT))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(DebugSamplingFilter(config.debug_sample_rate))
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.addHandler(queue_handler)
+    root.setLevel(config.level.upper())
+    for module, level in config.module_levels.items():
+        logging.getLogger(module).setLevel(level.upper())
+
+    listener = QueueListener(log_queue, stream_handler,
+                             respect_handler_level=True)
+    listener.start()
+    return listener
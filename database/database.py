@@ -1,13 +1,22 @@
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
-from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import DeclarativeBase
 from database.db_config import settings
+from metrics.metrics import instrument_engine
 
-sync_engine = create_engine(
+async_engine = create_async_engine(
     url=settings.DATABASE_URL_psycopg,
-    echo=False
+    echo=False,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=True
 )
 
-session_factory = sessionmaker(sync_engine)
+# Замеряем время выполнения SQL-запросов
+instrument_engine(async_engine)
+
+session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
 
 
 class Base(DeclarativeBase):
@@ -7,6 +7,11 @@ class Settings(BaseSettings):
     DB_USER: str
     DB_PASS: str
     DB_NAME: str
+    # Настройки пула соединений
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 5
+    DB_POOL_RECYCLE: int = 1800
 
     @property
     def DATABASE_URL_psycopg(self):
@@ -0,0 +1,388 @@
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from database.database import async_engine
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки, чтобы миграции не применялись
+# одновременно несколькими экземплярами бота
+MIGRATION_LOCK_ID = 4831207
+
+# Количество оценок каждого значения от 0 до 10, из которых
+# собирается гистограмма при заполнении статистики фильмов
+_HISTOGRAM_COLUMNS = ', '.join(
+    f'count(*) FILTER (WHERE rating = {score})' for score in range(11))
+
+# Запросы, приводящие таблицы, созданные до появления миграций через
+# create_all, к схеме первой миграции: tg_id становится BIGINT, строки
+# без обязательных полей удаляются, дубликаты фильмов объединяются,
+# из повторных оценок остается последняя. На новой базе ничего не меняют
+_LEGACY_SCHEMA_FIXES = [
+    'ALTER TABLE users ALTER COLUMN tg_id TYPE BIGINT',
+    '''
+    DELETE FROM ratings
+    WHERE user_id IS NULL OR film_id IS NULL
+       OR user_id IN (SELECT id FROM users WHERE tg_id IS NULL)
+       OR film_id IN (SELECT id FROM films WHERE wiki_link IS NULL)
+    ''',
+    '''
+    DELETE FROM reviews
+    WHERE user_id IS NULL OR film_id IS NULL
+       OR user_id IN (SELECT id FROM users WHERE tg_id IS NULL)
+       OR film_id IN (SELECT id FROM films WHERE wiki_link IS NULL)
+    ''',
+    'DELETE FROM users WHERE tg_id IS NULL',
+    'DELETE FROM films WHERE wiki_link IS NULL',
+    '''
+    CREATE TEMP TABLE film_duplicates AS
+    SELECT id, keep_id FROM (
+        SELECT id, min(id) OVER (PARTITION BY wiki_link) AS keep_id
+        FROM films
+    ) AS f
+    WHERE id <> keep_id
+    ''',
+    '''
+    UPDATE ratings SET film_id = d.keep_id
+    FROM film_duplicates AS d WHERE ratings.film_id = d.id
+    ''',
+    '''
+    UPDATE reviews SET film_id = d.keep_id
+    FROM film_duplicates AS d WHERE reviews.film_id = d.id
+    ''',
+    'DELETE FROM films USING film_duplicates AS d WHERE films.id = d.id',
+    'DROP TABLE film_duplicates',
+    '''
+    DELETE FROM ratings USING ratings AS newer
+    WHERE ratings.user_id = newer.user_id
+      AND ratings.film_id = newer.film_id
+      AND ratings.id < newer.id
+    ''',
+    'ALTER TABLE users ALTER COLUMN tg_id SET NOT NULL',
+    'ALTER TABLE films ALTER COLUMN wiki_link SET NOT NULL',
+    '''
+    ALTER TABLE ratings ALTER COLUMN user_id SET NOT NULL,
+                        ALTER COLUMN film_id SET NOT NULL
+    ''',
+    '''
+    ALTER TABLE reviews ALTER COLUMN user_id SET NOT NULL,
+                        ALTER COLUMN film_id SET NOT NULL
+    ''',
+]
+
+# Список миграций схемы: версия, описание и SQL-запросы.
+# Новые миграции добавляются только в конец списка
+MIGRATIONS: list[tuple[int, str, list[str]]] = [
+    (1, 'initial schema', [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            tg_id BIGINT NOT NULL UNIQUE,
+            user_name VARCHAR
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS films (
+            id SERIAL PRIMARY KEY,
+            title TEXT,
+            wiki_link TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS ratings (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            film_id INTEGER NOT NULL REFERENCES films (id),
+            rating INTEGER
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS reviews (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            film_id INTEGER NOT NULL REFERENCES films (id),
+            review TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS short_links (
+            id SERIAL PRIMARY KEY,
+            long_url TEXT UNIQUE,
+            short_url TEXT
+        )
+        ''',
+        *_LEGACY_SCHEMA_FIXES,
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS ix_films_wiki_link
+            ON films (wiki_link)
+        ''',
+        '''
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_constraint
+                           WHERE conname = 'uq_ratings_user_film'
+                             AND conrelid = 'ratings'::regclass) THEN
+                ALTER TABLE ratings ADD CONSTRAINT uq_ratings_user_film
+                    UNIQUE (user_id, film_id);
+            END IF;
+        END
+        $$
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS ix_reviews_user_film
+            ON reviews (user_id, film_id)
+        ''',
+    ]),
+    (2, 'ratings by user and score index', [
+        '''
+        CREATE INDEX IF NOT EXISTS ix_ratings_user_rating
+            ON ratings (user_id, rating DESC, film_id DESC)
+        ''',
+    ]),
+    (3, 'trigram index on film titles', [
+        'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+        '''
+        CREATE INDEX IF NOT EXISTS ix_films_title_trgm
+            ON films USING gin (title gin_trgm_ops)
+        ''',
+    ]),
+    (4, 'film statistics maintained by a trigger on ratings', [
+        '''
+        CREATE TABLE IF NOT EXISTS film_stats (
+            film_id INTEGER PRIMARY KEY
+                REFERENCES films (id) ON DELETE CASCADE,
+            ratings_count INTEGER NOT NULL DEFAULT 0,
+            ratings_sum INTEGER NOT NULL DEFAULT 0,
+            histogram INTEGER[] NOT NULL DEFAULT array_fill(0, ARRAY[11]),
+            avg_rating DOUBLE PRECISION GENERATED ALWAYS AS
+                (ratings_sum::double precision / NULLIF(ratings_count, 0))
+                STORED
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS ix_film_stats_avg_rating
+            ON film_stats (avg_rating DESC NULLS LAST, ratings_count DESC)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS ix_film_stats_ratings_count
+            ON film_stats (ratings_count DESC, film_id)
+        ''',
+        # Функция пересчитывает статистику фильма по изменению одной оценки.
+        # Элемент histogram[n + 1] хранит количество оценок n
+        '''
+        CREATE OR REPLACE FUNCTION film_stats_apply_rating() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.rating IS NOT NULL THEN
+                UPDATE film_stats
+                SET ratings_count = ratings_count - 1,
+                    ratings_sum = ratings_sum - OLD.rating,
+                    histogram[OLD.rating + 1] = histogram[OLD.rating + 1] - 1
+                WHERE film_id = OLD.film_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.rating IS NOT NULL THEN
+                INSERT INTO film_stats AS s
+                    (film_id, ratings_count, ratings_sum, histogram)
+                VALUES (NEW.film_id, 1, NEW.rating,
+                        (SELECT array_agg((i = NEW.rating)::int ORDER BY i)
+                         FROM generate_series(0, 10) AS i))
+                ON CONFLICT (film_id) DO UPDATE
+                SET ratings_count = s.ratings_count + 1,
+                    ratings_sum = s.ratings_sum + NEW.rating,
+                    histogram[NEW.rating + 1] =
+                        s.histogram[NEW.rating + 1] + 1;
+            END IF;
+            RETURN NULL;
+        END;
+        $$
+        ''',
+        '''
+        CREATE TRIGGER trg_ratings_film_stats
+            AFTER INSERT OR DELETE ON ratings
+            FOR EACH ROW EXECUTE FUNCTION film_stats_apply_rating()
+        ''',
+        # Повторная отправка той же оценки статистику не меняет
+        '''
+        CREATE TRIGGER trg_ratings_film_stats_update
+            AFTER UPDATE OF rating, film_id ON ratings
+            FOR EACH ROW
+            WHEN (OLD.rating IS DISTINCT FROM NEW.rating
+                  OR OLD.film_id <> NEW.film_id)
+            EXECUTE FUNCTION film_stats_apply_rating()
+        ''',
+        # Заполняем статистику по уже существующим оценкам
+        f'''
+        INSERT INTO film_stats
+            (film_id, ratings_count, ratings_sum, histogram)
+        SELECT film_id, count(rating), coalesce(sum(rating), 0),
+               ARRAY[{_HISTOGRAM_COLUMNS}]::integer[]
+        FROM ratings
+        WHERE rating IS NOT NULL
+        GROUP BY film_id
+        ON CONFLICT (film_id) DO NOTHING
+        ''',
+    ]),
+    (5, 'rating time and daily film statistics', [
+        # У существующих оценок время неизвестно, поэтому они не попадают
+        # ни в одно окно и учитываются только в общей статистике
+        '''
+        ALTER TABLE ratings ADD COLUMN IF NOT EXISTS
+            rated_at TIMESTAMPTZ NOT NULL DEFAULT '-infinity'
+        ''',
+        'ALTER TABLE ratings ALTER COLUMN rated_at SET DEFAULT now()',
+        '''
+        CREATE TABLE IF NOT EXISTS film_daily_stats (
+            day DATE NOT NULL,
+            film_id INTEGER NOT NULL
+                REFERENCES films (id) ON DELETE CASCADE,
+            ratings_count INTEGER NOT NULL DEFAULT 0,
+            ratings_sum INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, film_id)
+        )
+        ''',
+        # Оценка учитывается в статистике дня (по UTC), когда она была
+        # поставлена. При изменении оценка переносится в текущий день
+        '''
+        CREATE OR REPLACE FUNCTION film_stats_apply_rating() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.rating IS NOT NULL THEN
+                UPDATE film_stats
+                SET ratings_count = ratings_count - 1,
+                    ratings_sum = ratings_sum - OLD.rating,
+                    histogram[OLD.rating + 1] = histogram[OLD.rating + 1] - 1
+                WHERE film_id = OLD.film_id;
+                UPDATE film_daily_stats
+                SET ratings_count = ratings_count - 1,
+                    ratings_sum = ratings_sum - OLD.rating
+                WHERE day = (OLD.rated_at AT TIME ZONE 'UTC')::date
+                  AND film_id = OLD.film_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.rating IS NOT NULL THEN
+                INSERT INTO film_stats AS s
+                    (film_id, ratings_count, ratings_sum, histogram)
+                VALUES (NEW.film_id, 1, NEW.rating,
+                        (SELECT array_agg((i = NEW.rating)::int ORDER BY i)
+                         FROM generate_series(0, 10) AS i))
+                ON CONFLICT (film_id) DO UPDATE
+                SET ratings_count = s.ratings_count + 1,
+                    ratings_sum = s.ratings_sum + NEW.rating,
+                    histogram[NEW.rating + 1] =
+                        s.histogram[NEW.rating + 1] + 1;
+                INSERT INTO film_daily_stats AS d
+                    (day, film_id, ratings_count, ratings_sum)
+                VALUES ((NEW.rated_at AT TIME ZONE 'UTC')::date,
+                        NEW.film_id, 1, NEW.rating)
+                ON CONFLICT (day, film_id) DO UPDATE
+                SET ratings_count = d.ratings_count + 1,
+                    ratings_sum = d.ratings_sum + NEW.rating;
+            END IF;
+            RETURN NULL;
+        END;
+        $$
+        ''',
+        'DROP TRIGGER IF EXISTS trg_ratings_film_stats_update ON ratings',
+        '''
+        CREATE TRIGGER trg_ratings_film_stats_update
+            AFTER UPDATE OF rating, film_id, rated_at ON ratings
+            FOR EACH ROW
+            WHEN (OLD.rating IS DISTINCT FROM NEW.rating
+                  OR OLD.film_id <> NEW.film_id
+                  OR OLD.rated_at <> NEW.rated_at)
+            EXECUTE FUNCTION film_stats_apply_rating()
+        ''',
+    ]),
+    (6, 'canonical wiki links in films', [
+        # Раньше в films.wiki_link могла попасть сокращенная ссылка.
+        # Фильмы с сокращенной ссылкой, для которых уже есть строка
+        # с полной ссылкой, объединяются с этой строкой
+        '''
+        CREATE TEMP TABLE film_short_links AS
+        SELECT f.id, k.id AS keep_id
+        FROM films AS f
+        JOIN short_links AS s ON s.short_url = f.wiki_link
+        JOIN films AS k ON k.wiki_link = s.long_url
+        WHERE s.short_url <> s.long_url
+        ''',
+        # Если пользователь оценил обе строки, остается более новая оценка
+        '''
+        DELETE FROM ratings USING film_short_links AS d, ratings AS other
+        WHERE ratings.user_id = other.user_id
+          AND ((ratings.film_id = d.id AND other.film_id = d.keep_id)
+               OR (ratings.film_id = d.keep_id AND other.film_id = d.id))
+          AND ratings.id < other.id
+        ''',
+        '''
+        UPDATE ratings SET film_id = d.keep_id
+        FROM film_short_links AS d WHERE ratings.film_id = d.id
+        ''',
+        '''
+        UPDATE reviews SET film_id = d.keep_id
+        FROM film_short_links AS d WHERE reviews.film_id = d.id
+        ''',
+        'DELETE FROM films USING film_short_links AS d WHERE films.id = d.id',
+        'DROP TABLE film_short_links',
+        '''
+        UPDATE films SET wiki_link = s.long_url
+        FROM short_links AS s
+        WHERE films.wiki_link = s.short_url AND s.short_url <> s.long_url
+        ''',
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# Класс для применения миграций схемы базы данных
+class MigrationORM:
+    @staticmethod
+    async def get_schema_version(conn: AsyncConnection) -> int:
+        # Таблицы с версиями может еще не быть
+        exists = await conn.scalar(
+            text("SELECT to_regclass('schema_migrations') IS NOT NULL"))
+        if not exists:
+            return 0
+        version = await conn.scalar(
+            text('SELECT max(version) FROM schema_migrations'))
+        return version or 0
+
+    # Функция, применяющая недостающие миграции. Если схема актуальна,
+    # выполняется только проверка версии
+    @staticmethod
+    async def migrate() -> int:
+        async with async_engine.begin() as conn:
+            version = await MigrationORM.get_schema_version(conn)
+            if version >= LATEST_VERSION:
+                return version
+
+            await conn.execute(text('SELECT pg_advisory_xact_lock(:lock_id)'),
+                               {'lock_id': MIGRATION_LOCK_ID})
+            await conn.execute(text(
+                '''
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+                '''))
+            # Версия могла измениться, пока мы ждали блокировку
+            version = await MigrationORM.get_schema_version(conn)
+
+            # Все миграции применяются в одной транзакции
+            for migration_version, description, statements in MIGRATIONS:
+                if migration_version <= version:
+                    continue
+                logger.info('Applying migration %d: %s',
+                            migration_version, description)
+                for statement in statements:
+                    await conn.execute(text(statement))
+                await conn.execute(
+                    text('INSERT INTO schema_migrations '
+                         '(version, description) '
+                         'VALUES (:version, :description)'),
+                    {'version': migration_version,
+                     'description': description})
+                version = migration_version
+            return version
@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text
+from sqlalchemy import (Column, Integer, BigInteger, String, ForeignKey, Text,
+                        Index, UniqueConstraint, ARRAY, Computed, Date,
+                        DateTime, Float, func)
 
 from database.database import Base
 
@@ -7,31 +9,95 @@ class User(Base):
     __tablename__ = 'users'
 
     id = Column(Integer, primary_key=True)
-    tg_id = Column(Integer, unique=True)
+    # id в Telegram не помещаются в int32
+    tg_id = Column(BigInteger, unique=True, nullable=False)
     user_name = Column(String)
 
 
 class Film(Base):
     __tablename__ = 'films'
+    __table_args__ = (
+        Index('ix_films_wiki_link', 'wiki_link', unique=True),
+        # Триграммный индекс для нечеткого поиска по названию
+        Index('ix_films_title_trgm', 'title', postgresql_using='gin',
+              postgresql_ops={'title': 'gin_trgm_ops'}),
+    )
 
     id = Column(Integer, primary_key=True)
     title = Column(Text)
-    wiki_link = Column(Text)
+    wiki_link = Column(Text, nullable=False)
 
 
 class Rating(Base):
     __tablename__ = 'ratings'
+    __table_args__ = (
+        UniqueConstraint('user_id', 'film_id', name='uq_ratings_user_film'),
+    )
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.id'))
-    film_id = Column(Integer, ForeignKey('films.id'))
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    film_id = Column(Integer, ForeignKey('films.id'), nullable=False)
     rating = Column(Integer)
+    # Время, когда была поставлена текущая оценка
+    rated_at = Column(DateTime(timezone=True), nullable=False,
+                      server_default=func.now())
+
+
+# Индекс для списка фильмов пользователя, отсортированного по оценкам
+Index('ix_ratings_user_rating',
+      Rating.user_id, Rating.rating.desc(), Rating.film_id.desc())
+
+
+# Статистика оценок фильма. Таблица обновляется триггером на 'ratings'
+# в том же запросе, что и оценка, поэтому читается одной строкой
+class FilmStats(Base):
+    __tablename__ = 'film_stats'
+
+    film_id = Column(Integer, ForeignKey('films.id', ondelete='CASCADE'),
+                     primary_key=True)
+    ratings_count = Column(Integer, nullable=False, default=0)
+    ratings_sum = Column(Integer, nullable=False, default=0)
+    # Количество оценок от 0 до 10: histogram[n] - количество оценок n
+    histogram = Column(ARRAY(Integer), nullable=False)
+    avg_rating = Column(Float, Computed(
+        'ratings_sum::double precision / NULLIF(ratings_count, 0)'))
+
+
+# Индексы для списков фильмов с лучшей средней оценкой
+# и с наибольшим количеством оценок
+Index('ix_film_stats_avg_rating',
+      FilmStats.avg_rating.desc().nulls_last(), FilmStats.ratings_count.desc())
+Index('ix_film_stats_ratings_count',
+      FilmStats.ratings_count.desc(), FilmStats.film_id)
+
+
+# Статистика оценок фильма за один день (по UTC). Используется для списков
+# лучших фильмов за последние дни без чтения таблицы 'ratings'
+class FilmDailyStats(Base):
+    __tablename__ = 'film_daily_stats'
+
+    day = Column(Date, primary_key=True)
+    film_id = Column(Integer, ForeignKey('films.id', ondelete='CASCADE'),
+                     primary_key=True)
+    ratings_count = Column(Integer, nullable=False, default=0)
+    ratings_sum = Column(Integer, nullable=False, default=0)
 
 
 class Review(Base):
     __tablename__ = 'reviews'
+    __table_args__ = (
+        Index('ix_reviews_user_film', 'user_id', 'film_id'),
+    )
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.id'))
-    film_id = Column(Integer, ForeignKey('films.id'))
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    film_id = Column(Integer, ForeignKey('films.id'), nullable=False)
     review = Column(Text)
+
+
+class ShortLink(Base):
+    __tablename__ = 'short_links'
+
+    id = Column(Integer, primary_key=True)
+    long_url = Column(Text, unique=True)
+    short_url = Column(Text)
@@ -1,89 +1,498 @@
-from database.database import sync_engine, session_factory
-from database.models import Film, Rating, User, Review, Base
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator
 
+from sqlalchemy import Float, case, func, select, tuple_, union
+from sqlalchemy.dialects.postgresql import insert
 
-# Класс для создания таблицы
-class TableORM:
-    @staticmethod
-    def create_tables():
-        Base.metadata.drop_all(sync_engine)
-        sync_engine.echo = False
-        Base.metadata.create_all(sync_engine)
-        sync_engine.echo = False
+from database.database import session_factory
+from database.models import (Film, FilmDailyStats, FilmStats, Rating, User,
+                             Review, ShortLink)
+from metrics.metrics import register_cache
+from services.cache import TTLCache
+
+# Количество фильмов на одной странице библиотеки пользователя
+FILMS_PAGE_SIZE = 10
+# Максимальное количество результатов поиска по локальному каталогу
+SEARCH_LIMIT = 10
+# Размер и время жизни кэшей для часто запрашиваемых данных
+USER_CACHE_SIZE = 10000
+FILM_CACHE_SIZE = 10000
+ORM_CACHE_TTL = 60 * 60
+# Количество строк, которые читаются с сервера за раз при выгрузке
+EXPORT_BATCH_SIZE = 1000
+
+# Кэш связок "id в Telegram - id пользователя"
+user_id_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=ORM_CACHE_TTL)
+# Кэш фильмов по id
+film_cache = TTLCache(maxsize=FILM_CACHE_SIZE, ttl=ORM_CACHE_TTL)
+register_cache('user_ids', user_id_cache)
+register_cache('films', film_cache)
 
 
 # Класс для работы с таблицей 'users'
 class UserORM:
     @staticmethod
-    def get_user_id(tg_id: int) -> int | None:
-        with session_factory() as session:
-            user = session.query(User).filter_by(tg_id=tg_id).first()
-            return user.id if user else None
+    async def get_user_id(tg_id: int) -> int | None:
+        return await user_id_cache.get_or_load(
+            tg_id, lambda: UserORM._load_user_id(tg_id))
+
+    @staticmethod
+    async def _load_user_id(tg_id: int) -> int | None:
+        async with session_factory() as session:
+            return await session.scalar(
+                select(User.id).filter_by(tg_id=tg_id))
+
+    @staticmethod
+    async def set_user(tg_id: int, user_name: str) -> int:
+        async with session_factory() as session:
+            # Добавляем пользователя или обновляем имя вернувшегося
+            # пользователя одним запросом
+            stmt = insert(User).values(tg_id=tg_id, user_name=user_name)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[User.tg_id],
+                set_={'user_name': stmt.excluded.user_name}
+            ).returning(User.id)
+            user_id = await session.scalar(stmt)
+            await session.commit()
+        user_id_cache.set(tg_id, user_id)
+        return user_id
 
+    # Функция, возвращающая пары (id, tg_id) всех пользователей
     @staticmethod
-    def set_user(tg_id: int, user_name: str) -> None:
-        with session_factory() as session:
-            new_user = User(tg_id=tg_id, user_name=user_name)
-            session.add(new_user)
-            session.commit()
+    async def get_users() -> list[tuple[int, int]]:
+        async with session_factory() as session:
+            result = await session.execute(
+                select(User.id, User.tg_id).order_by(User.id))
+            return [tuple(row) for row in result]
 
 
 # Класс для работы с таблицей 'films'
 class FilmORM:
     @staticmethod
-    def get_or_create_film(title: str, wiki_link: str) -> int:
-        with session_factory() as session:
-            # Пытаемся получить объект фильма по ссылке
-            film = session.query(Film).filter_by(wiki_link=wiki_link).first()
-            if film:
-                return film.id
-            else:
-                # Если фильм не найден, создаем новый объект фильма
-                new_film = Film(title=title, wiki_link=wiki_link)
-                session.add(new_film)
-                session.commit()
-                return new_film.id
+    async def get_or_create_film(title: str, wiki_link: str) -> int:
+        async with session_factory() as session:
+            # Добавляем фильм, если его еще нет. Существующая строка
+            # не обновляется, чтобы выбор фильма не создавал новую версию
+            # строки и записи в индексе названий
+            stmt = insert(Film).values(title=title, wiki_link=wiki_link)
+            stmt = stmt.on_conflict_do_nothing(
+                index_elements=[Film.wiki_link]
+            ).returning(Film.id)
+            film_id = await session.scalar(stmt)
+            if film_id is None:
+                # DO NOTHING не возвращает строку при конфликте
+                film_id = await session.scalar(
+                    select(Film.id).where(Film.wiki_link == wiki_link))
+            await session.commit()
+        return film_id
+
+    # Функция, добавляющая несколько фильмов одним запросом и
+    # возвращающая связки "ссылка - id фильма". Названия фильмов
+    # приходят из файлов пользователей, поэтому названия фильмов,
+    # которые уже есть в каталоге, не перезаписываются
+    @staticmethod
+    async def get_or_create_films(
+            films: list[tuple[str, str]]) -> dict[str, int]:
+        # Убираем повторы ссылок, оставляя первое название
+        unique_films: dict[str, str] = {}
+        for title, wiki_link in films:
+            unique_films.setdefault(wiki_link, title)
+        if not unique_films:
+            return {}
+        stmt = insert(Film).values(
+            [{'title': title, 'wiki_link': wiki_link}
+             for wiki_link, title in unique_films.items()])
+        stmt = stmt.on_conflict_do_nothing(
+            index_elements=[Film.wiki_link]
+        ).returning(Film.wiki_link, Film.id)
+        async with session_factory() as session:
+            film_ids = {wiki_link: film_id for wiki_link, film_id
+                        in await session.execute(stmt)}
+            # DO NOTHING не возвращает строки, которые уже были в таблице,
+            # поэтому их id получаем отдельным запросом
+            existing = [wiki_link for wiki_link in unique_films
+                        if wiki_link not in film_ids]
+            if existing:
+                result = await session.execute(
+                    select(Film.wiki_link, Film.id)
+                    .where(Film.wiki_link.in_(existing)))
+                film_ids.update(
+                    {wiki_link: film_id for wiki_link, film_id in result})
+            await session.commit()
+        return film_ids
 
+    # Функция, возвращающая страницу фильмов пользователя (с оценкой,
+    # если она есть) и признаки наличия предыдущей и следующей страниц.
+    # Используется keyset-пагинация по id фильма: страница начинается
+    # после after_id или заканчивается перед before_id
     @staticmethod
-    def get_all_films() -> dict[int, str] | None:
-        with session_factory() as session:
-            films = session.query(Film).all()
-            return {film.id: film.title for film in films}
+    async def get_user_films(
+            user_id: int,
+            after_id: int | None = None,
+            before_id: int | None = None,
+            limit: int = FILMS_PAGE_SIZE
+    ) -> tuple[list[tuple[int, str, int | None]], bool, bool]:
+        # id фильмов, которые пользователь оценил или отрецензировал
+        user_films = union(
+            select(Rating.film_id).where(Rating.user_id == user_id),
+            select(Review.film_id).where(Review.user_id == user_id)
+        ).subquery()
+        stmt = (
+            select(Film.id, Film.title, Rating.rating)
+            .join(user_films, user_films.c.film_id == Film.id)
+            .outerjoin(Rating, (Rating.film_id == Film.id)
+                       & (Rating.user_id == user_id))
+        )
+        if before_id is not None:
+            stmt = stmt.where(Film.id < before_id).order_by(Film.id.desc())
+        else:
+            if after_id is not None:
+                stmt = stmt.where(Film.id > after_id)
+            stmt = stmt.order_by(Film.id)
+        # Запрашиваем на одну запись больше, чтобы узнать,
+        # есть ли еще страница
+        stmt = stmt.limit(limit + 1)
 
+        async with session_factory() as session:
+            films = [tuple(row) for row in await session.execute(stmt)]
+
+        has_more = len(films) > limit
+        films = films[:limit]
+        if before_id is not None:
+            films.reverse()
+            return films, has_more, True
+        return films, after_id is not None, has_more
+
+    # Функция нечеткого поиска по названиям фильмов в каталоге.
+    # Оператор % использует триграммный индекс ix_films_title_trgm
     @staticmethod
-    def get_film(film_id: int) -> Film:
-        with session_factory() as session:
-            return session.query(Film).get(film_id)
+    async def search_films(
+            query: str,
+            limit: int = SEARCH_LIMIT) -> list[tuple[str, str, float]]:
+        similarity = func.similarity(Film.title, query)
+        stmt = (
+            select(Film.title, Film.wiki_link, similarity)
+            .where(Film.title.op('%')(query))
+            .order_by(similarity.desc())
+            .limit(limit)
+        )
+        async with session_factory() as session:
+            return [tuple(row) for row in await session.execute(stmt)]
+
+    # Функция нечеткого поиска по названиям фильмов пользователя
+    @staticmethod
+    async def search_user_films(
+            user_id: int,
+            query: str,
+            limit: int = SEARCH_LIMIT) -> list[tuple[int, str, int | None]]:
+        user_films = union(
+            select(Rating.film_id).where(Rating.user_id == user_id),
+            select(Review.film_id).where(Review.user_id == user_id)
+        ).subquery()
+        stmt = (
+            select(Film.id, Film.title, Rating.rating)
+            .join(user_films, user_films.c.film_id == Film.id)
+            .outerjoin(Rating, (Rating.film_id == Film.id)
+                       & (Rating.user_id == user_id))
+            .where(Film.title.op('%')(query))
+            .order_by(func.similarity(Film.title, query).desc())
+            .limit(limit)
+        )
+        async with session_factory() as session:
+            return [tuple(row) for row in await session.execute(stmt)]
+
+    # Функция, возвращающая фильм по id. Возвращаемый объект общий
+    # для всех вызовов, изменять его нельзя
+    @staticmethod
+    async def get_film(film_id: int) -> Film | None:
+        return await film_cache.get_or_load(
+            film_id, lambda: FilmORM._load_film(film_id))
+
+    @staticmethod
+    async def _load_film(film_id: int) -> Film | None:
+        async with session_factory() as session:
+            return await session.get(Film, film_id)
 
 
 # Класс для работы с таблицей 'ratings'
 class RatingORM:
+    # Значения для обновления существующей оценки. Время оценки меняется,
+    # только если изменилась сама оценка
+    @staticmethod
+    def _update_values(excluded) -> dict:
+        return {
+            'rating': excluded.rating,
+            'rated_at': case(
+                (Rating.rating.is_distinct_from(excluded.rating), func.now()),
+                else_=Rating.rated_at)
+        }
+
+    @staticmethod
+    async def set_or_update_rating(user_id: int,
+                                   film_id: int, new_rating: int) -> int:
+        async with session_factory() as session:
+            # Добавляем оценку или обновляем существующую одним запросом
+            stmt = insert(Rating).values(user_id=user_id, film_id=film_id,
+                                         rating=new_rating)
+            stmt = stmt.on_conflict_do_update(
+                constraint='uq_ratings_user_film',
+                set_=RatingORM._update_values(stmt.excluded)
+            ).returning(Rating.id)
+            rating_id = await session.scalar(stmt)
+            await session.commit()
+            return rating_id
+
+    # Функция, добавляющая или обновляющая несколько оценок одним запросом.
+    # Оценки упорядочены по фильмам, чтобы параллельные запросы блокировали
+    # строки 'film_stats' в одном порядке и не приводили к взаимоблокировкам
+    @staticmethod
+    async def set_ratings(ratings: list[tuple[int, int, int]]) -> None:
+        async with session_factory() as session:
+            stmt = insert(Rating).values(
+                [{'user_id': user_id, 'film_id': film_id, 'rating': rating}
+                 for user_id, film_id, rating
+                 in sorted(ratings, key=lambda row: (row[1], row[0]))])
+            stmt = stmt.on_conflict_do_update(
+                constraint='uq_ratings_user_film',
+                set_=RatingORM._update_values(stmt.excluded))
+            await session.execute(stmt)
+            await session.commit()
+
+    # Функция, возвращающая страницу фильмов пользователя, отсортированных
+    # по убыванию оценки, и признаки наличия предыдущей и следующей страниц.
+    # Keyset-пагинация по паре (оценка, id фильма) использует индекс
+    # ix_ratings_user_rating, поэтому время запроса не зависит от
+    # количества оценок пользователя
     @staticmethod
-    def set_or_update_rating(user_id: int,
-                             film_id: int, new_rating: int) -> None:
-        with session_factory() as session:
-            # Пытаемся получить объект оценки пользователя для данного фильма
-            rating = session.query(Rating).filter_by(user_id=user_id,
-                                                     film_id=film_id).first()
-            if rating:
-                # Если оценка уже существует, обновляем ее
-                rating.rating = new_rating
-            else:
-                # Если оценка не существует, создаем новую
-                new_rating_obj = Rating(user_id=user_id, film_id=film_id,
-                                        rating=new_rating)
-                session.add(new_rating_obj)
-            session.commit()
+    async def get_user_films_by_rating(
+            user_id: int,
+            after: tuple[int, int] | None = None,
+            before: tuple[int, int] | None = None,
+            limit: int = FILMS_PAGE_SIZE
+    ) -> tuple[list[tuple[int, str, int]], bool, bool]:
+        stmt = (
+            select(Film.id, Film.title, Rating.rating)
+            .join(Film, Film.id == Rating.film_id)
+            .where(Rating.user_id == user_id, Rating.rating.is_not(None))
+        )
+        cursor = tuple_(Rating.rating, Rating.film_id)
+        if before is not None:
+            stmt = stmt.where(cursor > tuple_(*before)).order_by(
+                Rating.rating, Rating.film_id)
+        else:
+            if after is not None:
+                stmt = stmt.where(cursor < tuple_(*after))
+            stmt = stmt.order_by(Rating.rating.desc(), Rating.film_id.desc())
+        stmt = stmt.limit(limit + 1)
+
+        async with session_factory() as session:
+            films = [tuple(row) for row in await session.execute(stmt)]
+
+        has_more = len(films) > limit
+        films = films[:limit]
+        if before is not None:
+            films.reverse()
+            return films, has_more, True
+        return films, after is not None, has_more
+
+    # Функция для массовой загрузки оценок: строки передаются через COPY
+    # во временную таблицу и переносятся в 'ratings' одним запросом.
+    # Если фильм встречается в пачке несколько раз, остается последняя
+    # по порядку строка
+    @staticmethod
+    async def copy_ratings(ratings: list[tuple[int, int, int]]) -> None:
+        async with session_factory() as session:
+            conn = await session.connection()
+            raw_conn = (await conn.get_raw_connection()).driver_connection
+            async with raw_conn.cursor() as cursor:
+                await cursor.execute(
+                    'CREATE TEMP TABLE import_ratings '
+                    '(ord INTEGER, user_id INTEGER, film_id INTEGER, '
+                    'rating INTEGER) ON COMMIT DROP')
+                async with cursor.copy(
+                        'COPY import_ratings (ord, user_id, film_id, rating) '
+                        'FROM STDIN') as copy:
+                    for position, row in enumerate(ratings):
+                        await copy.write_row((position, *row))
+                await cursor.execute(
+                    'INSERT INTO ratings (user_id, film_id, rating) '
+                    'SELECT DISTINCT ON (film_id, user_id) '
+                    'user_id, film_id, rating FROM import_ratings '
+                    'ORDER BY film_id, user_id, ord DESC '
+                    'ON CONFLICT ON CONSTRAINT uq_ratings_user_film '
+                    'DO UPDATE SET rating = EXCLUDED.rating, '
+                    'rated_at = CASE WHEN ratings.rating IS DISTINCT FROM '
+                    'EXCLUDED.rating THEN now() ELSE ratings.rated_at END')
+            await session.commit()
+
+
+# Класс для работы с таблицей 'film_stats'
+class FilmStatsORM:
+    @staticmethod
+    async def get_film_stats(film_id: int) -> FilmStats | None:
+        async with session_factory() as session:
+            return await session.get(FilmStats, film_id)
+
+    # Функция, возвращающая фильмы с лучшей средней оценкой среди фильмов,
+    # у которых не меньше min_count оценок
+    @staticmethod
+    async def get_top_rated(
+            limit: int = FILMS_PAGE_SIZE,
+            min_count: int = 1) -> list[tuple[int, str, float, int]]:
+        stmt = (
+            select(Film.id, Film.title,
+                   FilmStats.avg_rating, FilmStats.ratings_count)
+            .join(Film, Film.id == FilmStats.film_id)
+            .where(FilmStats.ratings_count >= max(min_count, 1))
+            .order_by(FilmStats.avg_rating.desc().nulls_last(),
+                      FilmStats.ratings_count.desc())
+            .limit(limit)
+        )
+        async with session_factory() as session:
+            return [tuple(row) for row in await session.execute(stmt)]
+
+    # Функция, возвращающая фильмы с наибольшим количеством оценок
+    @staticmethod
+    async def get_most_rated(
+            limit: int = FILMS_PAGE_SIZE) -> list[tuple[int, str, float, int]]:
+        stmt = (
+            select(Film.id, Film.title,
+                   FilmStats.avg_rating, FilmStats.ratings_count)
+            .join(Film, Film.id == FilmStats.film_id)
+            .where(FilmStats.ratings_count > 0)
+            .order_by(FilmStats.ratings_count.desc(), FilmStats.film_id)
+            .limit(limit)
+        )
+        async with session_factory() as session:
+            return [tuple(row) for row in await session.execute(stmt)]
+
+    # Функция, возвращающая фильмы с лучшей средней оценкой и фильмы
+    # с наибольшим количеством оценок за последние days дней. Читается
+    # только дневная статистика за эти дни, а не таблица 'ratings'
+    @staticmethod
+    async def get_window_charts(
+            days: int,
+            limit: int = FILMS_PAGE_SIZE,
+            min_count: int = 1
+    ) -> tuple[list[tuple[int, str, float, int]],
+               list[tuple[int, str, float, int]]]:
+        since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+        ratings_count = func.sum(FilmDailyStats.ratings_count)
+        window_stats = (
+            select(FilmDailyStats.film_id,
+                   ratings_count.label('ratings_count'),
+                   (func.sum(FilmDailyStats.ratings_sum).cast(Float)
+                    / ratings_count).label('avg_rating'))
+            .where(FilmDailyStats.day >= since)
+            .group_by(FilmDailyStats.film_id)
+            .having(ratings_count > 0)
+            .cte('window_stats')
+        )
+        chart = (
+            select(Film.id, Film.title,
+                   window_stats.c.avg_rating, window_stats.c.ratings_count)
+            .join(Film, Film.id == window_stats.c.film_id)
+            .limit(limit)
+        )
+        top_rated = (
+            chart.where(window_stats.c.ratings_count >= min_count)
+            .order_by(window_stats.c.avg_rating.desc(),
+                      window_stats.c.ratings_count.desc(), Film.id)
+        )
+        most_rated = chart.order_by(window_stats.c.ratings_count.desc(),
+                                    Film.id)
+        async with session_factory() as session:
+            return ([tuple(row) for row in await session.execute(top_rated)],
+                    [tuple(row) for row in await session.execute(most_rated)])
 
 
 # Класс для работы с таблицей 'reviews'
 class ReviewORM:
     @staticmethod
-    def set_review(user_id: int, film_id: int, review: int) -> None:
-        with session_factory() as session:
+    async def set_review(user_id: int, film_id: int, review: str) -> None:
+        async with session_factory() as session:
             # Создаем объект рецензии
             new_review = Review(user_id=user_id, film_id=film_id,
                                 review=review)
             # Добавляем оценку и фиксируем изменения в базе данных
             session.add(new_review)
-            session.commit()
+            await session.commit()
+
+    # Функция для массовой загрузки рецензий через COPY. Рецензии, которые
+    # уже есть у пользователя, не дублируются при повторной загрузке
+    @staticmethod
+    async def copy_reviews(reviews: list[tuple[int, int, str]]) -> None:
+        async with session_factory() as session:
+            conn = await session.connection()
+            raw_conn = (await conn.get_raw_connection()).driver_connection
+            async with raw_conn.cursor() as cursor:
+                await cursor.execute(
+                    'CREATE TEMP TABLE import_reviews '
+                    '(user_id INTEGER, film_id INTEGER, review TEXT) '
+                    'ON COMMIT DROP')
+                async with cursor.copy(
+                        'COPY import_reviews (user_id, film_id, review) '
+                        'FROM STDIN') as copy:
+                    for row in reviews:
+                        await copy.write_row(row)
+                await cursor.execute(
+                    'INSERT INTO reviews (user_id, film_id, review) '
+                    'SELECT DISTINCT i.user_id, i.film_id, i.review '
+                    'FROM import_reviews i WHERE NOT EXISTS ('
+                    'SELECT 1 FROM reviews r WHERE r.user_id = i.user_id '
+                    'AND r.film_id = i.film_id AND r.review = i.review)')
+            await session.commit()
+
+
+# Класс для выгрузки библиотеки пользователя
+class LibraryORM:
+    # Функция, построчно возвращающая фильмы пользователя с оценками и
+    # рецензиями. Строки читаются через серверный курсор частями по
+    # batch_size, поэтому потребление памяти не зависит от размера библиотеки
+    @staticmethod
+    async def stream_user_library(
+            user_id: int,
+            batch_size: int = EXPORT_BATCH_SIZE
+    ) -> AsyncIterator[tuple[str, str, int | None, str | None]]:
+        user_films = union(
+            select(Rating.film_id).where(Rating.user_id == user_id),
+            select(Review.film_id).where(Review.user_id == user_id)
+        ).subquery()
+        stmt = (
+            select(Film.title, Film.wiki_link, Rating.rating, Review.review)
+            .join(user_films, user_films.c.film_id == Film.id)
+            .outerjoin(Rating, (Rating.film_id == Film.id)
+                       & (Rating.user_id == user_id))
+            .outerjoin(Review, (Review.film_id == Film.id)
+                       & (Review.user_id == user_id))
+            .order_by(Film.id, Review.id)
+            .execution_options(yield_per=batch_size)
+        )
+        async with session_factory() as session:
+            result = await session.stream(stmt)
+            async for partition in result.partitions():
+                for row in partition:
+                    yield tuple(row)
+
+
+# Класс для работы с таблицей 'short_links'
+class ShortLinkORM:
+    @staticmethod
+    async def get_short_urls(long_urls: list[str]) -> dict[str, str]:
+        async with session_factory() as session:
+            links = await session.execute(
+                select(ShortLink.long_url, ShortLink.short_url).where(
+                    ShortLink.long_url.in_(long_urls)))
+            return {long_url: short_url for long_url, short_url in links}
+
+    @staticmethod
+    async def set_short_urls(links: dict[str, str]) -> None:
+        async with session_factory() as session:
+            # Добавляем все связки одним запросом,
+            # уже сохраненные ссылки пропускаем
+            stmt = insert(ShortLink).values(
+                [{'long_url': long_url, 'short_url': short_url}
+                 for long_url, short_url in links.items()]
+            ).on_conflict_do_nothing(index_elements=[ShortLink.long_url])
+            await session.execute(stmt)
+            await session.commit()
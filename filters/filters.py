@@ -1,12 +1,21 @@
-import re
-
 from aiogram.filters import BaseFilter
 from aiogram.types import CallbackQuery
 
+from keyboards.callback_data import RatingCallback
+
 
+# Фильтр для кнопок с оценками. Разобранные данные передаются
+# в хэндлер в аргументе callback_data
 class IsRating(BaseFilter):
-    async def __call__(self, callback: CallbackQuery):
-        if callback.data.startswith('rating-'):
-            rating = callback.data.split('rating-')[1].strip()
-            return re.match(r'^(?:[0-9]|10)$', rating) and rating.isdigit()
+    async def __call__(
+            self, callback: CallbackQuery
+    ) -> bool | dict[str, RatingCallback]:
+        if not callback.data:
+            return False
+        try:
+            callback_data = RatingCallback.unpack(callback.data)
+        except (TypeError, ValueError):
+            return False
+        if 0 <= callback_data.value <= 10:
+            return {'callback_data': callback_data}
         return False
@@ -0,0 +1,109 @@
+import logging
+
+from aiogram import Bot, Router, F, html
+from aiogram.filters import Command, CommandObject, StateFilter
+from aiogram.types import Message
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import default_state
+
+from database.orm import UserORM
+from keyboards.keyboards import get_keyboard
+from services.library_io import (LIBRARY_FORMATS, LibraryExportFile,
+                                 LibraryFormatError, detect_format,
+                                 import_library)
+from services.rating_buffer import rating_buffer
+from states.states import FSMLibraryMenu
+from states.state_management import StateHistory
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+# Бот может скачать из Telegram файл размером не больше 20 МБ
+MAX_IMPORT_FILE_SIZE = 20 * 1024 * 1024
+# Таймаут на скачивание загружаемого файла
+IMPORT_DOWNLOAD_TIMEOUT = 300
+# Ответ пользователю, которого еще нет в базе данных
+NO_USER_TEXT = 'Сначала отправьте команду /start'
+
+
+# Класс, содержащий обработчики для команд /export и /import
+class LibraryHandler:
+    # Этот хэндлер будет срабатывать на команду /export
+    # и отправлять пользователю файл со всеми его оценками и рецензиями
+    @router.message(Command(commands='export'), ~StateFilter(default_state))
+    async def process_export_command(message: Message,
+                                     command: CommandObject):
+        fmt = (command.args or 'csv').strip().lower()
+        if fmt not in LIBRARY_FORMATS:
+            await message.answer(
+                text='Поддерживаемые форматы: ' + ', '.join(LIBRARY_FORMATS))
+            return
+        user_id = await UserORM.get_user_id(int(message.from_user.id))
+        if user_id is None:
+            await message.answer(text=NO_USER_TEXT)
+            return
+        # Записываем накопленные оценки, чтобы они попали в выгрузку
+        await rating_buffer.flush_user(user_id)
+        await message.answer_document(
+            document=LibraryExportFile(user_id, fmt),
+            caption='Ваши оценки и рецензии')
+
+    # Этот хэндлер будет срабатывать на команду /import
+    @router.message(Command(commands='import'), ~StateFilter(default_state))
+    async def process_import_command(message: Message, state: FSMContext):
+        # Текст над клавиатурой
+        text = ('Пришлите файл CSV или JSONL с колонками '
+                'title, wiki_link, rating, review')
+        # Идентификатор клавиатуры
+        reply_markup = 'navigation'
+        # Данные текущего состояния
+        state_data = {'message_data': {'text': text,
+                                       'reply_markup': reply_markup}}
+
+        current_state = FSMLibraryMenu.send_import_file
+        # Добавляем в историю состояний текущее состояние
+        await StateHistory.add_state(state, current_state)
+        # Добавляем в хранилище данные текущего состония
+        await state.update_data(send_import_file=state_data)
+        # Устанавливаем текущее состояние
+        await state.set_state(current_state)
+
+        await message.answer(text=text,
+                             reply_markup=get_keyboard(reply_markup))
+
+    # Этот хэндлер будет срабатывать на файл после команды /import.
+    # Файл скачивается и разбирается по частям
+    @router.message(StateFilter(FSMLibraryMenu.send_import_file), F.document)
+    async def process_import_file_sent(message: Message, bot: Bot):
+        document = message.document
+        fmt = detect_format(document.file_name)
+        if fmt is None:
+            await message.answer(
+                text='Пришлите файл с расширением .csv или .jsonl')
+            return
+        if document.file_size and document.file_size > MAX_IMPORT_FILE_SIZE:
+            await message.answer(text='Файл больше 20 МБ')
+            return
+
+        user_id = await UserORM.get_user_id(int(message.from_user.id))
+        if user_id is None:
+            await message.answer(text=NO_USER_TEXT)
+            return
+        file = await bot.get_file(document.file_id)
+        chunks = bot.session.stream_content(
+            bot.session.api.file_url(bot.token, file.file_path),
+            timeout=IMPORT_DOWNLOAD_TIMEOUT)
+        try:
+            result = await import_library(user_id, chunks, fmt)
+        except LibraryFormatError as e:
+            await message.answer(
+                text=f'Не удалось загрузить файл: {html.quote(str(e))}')
+            return
+
+        lines = [f'Загружено оценок: {result.ratings}',
+                 f'Загружено рецензий: {result.reviews}']
+        if result.skipped:
+            lines.append(f'Пропущено строк: {result.skipped}')
+            lines.extend(html.quote(error) for error in result.errors)
+        await message.answer(text='\n'.join(lines),
+                             reply_markup=get_keyboard('navigation'))
@@ -0,0 +1,70 @@
+import logging
+
+from aiogram import Router, html
+from aiogram.filters import Command, StateFilter
+from aiogram.types import CallbackQuery, Message
+from aiogram.fsm.state import default_state
+
+from keyboards.callback_data import TopCallback
+from keyboards.keyboards import TopMenu
+from services.leaderboard import Leaderboards
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+
+# Функция, формирующая текст списка фильмов
+def _render_chart(leaderboards: Leaderboards,
+                  most_rated: bool, window: int) -> str:
+    title = 'Популярные фильмы' if most_rated else 'Лучшие фильмы'
+    lines = [f'<b>{title} {TopMenu.window_label(window)}</b>\n']
+    charts = leaderboards.get(window)
+    if charts is None:
+        lines.append('Список еще формируется, попробуйте позже')
+        return '\n'.join(lines)
+
+    films = charts.most_rated if most_rated else charts.top_rated
+    if not films:
+        lines.append('Пока недостаточно оценок')
+    for position, (_, film_title, avg_rating, count) in enumerate(films, 1):
+        lines.append(f'{position}. {html.quote(film_title)} — '
+                     f'{avg_rating:.1f} (оценок: {count})')
+    return '\n'.join(lines)
+
+
+# Класс, содержащий обработчики для команды /top
+class TopCommandHandler:
+    # Этот хэндлер будет срабатывать на команду /top и
+    # отправлять список лучших фильмов за первое окно из настроек
+    @router.message(Command(commands='top'), ~StateFilter(default_state))
+    async def process_top_command(message: Message,
+                                  leaderboards: Leaderboards):
+        # Состояние не меняется, поэтому история состояний остается
+        # прежней и кнопка "Назад" возвращает на предыдущий экран
+        window = leaderboards.windows[0]
+        await message.answer(
+            text=_render_chart(leaderboards, False, window),
+            reply_markup=TopMenu.create_top_menu_kb(
+                False, window, leaderboards.windows)
+        )
+
+    # Этот хэндлер будет срабатывать на кнопки переключения списков
+    @router.callback_query(TopCallback.filter())
+    async def process_top_press(callback: CallbackQuery,
+                                callback_data: TopCallback,
+                                leaderboards: Leaderboards):
+        # Кнопка могла остаться от списка, которого больше нет в настройках
+        if callback_data.window not in leaderboards.windows:
+            await callback.answer(text='Такого списка нет')
+            return
+        text = _render_chart(leaderboards, callback_data.most_rated,
+                             callback_data.window)
+        reply_markup = TopMenu.create_top_menu_kb(
+            callback_data.most_rated, callback_data.window,
+            leaderboards.windows)
+        # Telegram не позволяет отправить сообщение без изменений
+        if (text != callback.message.html_text
+                or reply_markup != callback.message.reply_markup):
+            await callback.message.edit_text(text=text,
+                                             reply_markup=reply_markup)
+        await callback.answer()
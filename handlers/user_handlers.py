@@ -1,6 +1,6 @@
 import logging
 
-from aiogram import Router, F
+from aiogram import Router, F, html
 from aiogram.filters import Command, CommandStart, StateFilter
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
@@ -8,17 +8,22 @@ from aiogram.fsm.state import default_state
 
 from lexicon.lexicon import LEXICON
 from filters.filters import IsRating
+from keyboards.callback_data import (FilmCallback, FilmsPageCallback,
+                                     RatedPageCallback, RatingCallback,
+                                     SuggestionCallback)
 from services.film_service import search_films
+from services.link_service import shorten_urls
+from services.rating_buffer import rating_buffer
 from keyboards.keyboards import (MainMenu, RateReviewFilmMenu,
-                                 MyFilmsMenu, StartMenu, Navigation)
-from database.orm import UserORM, FilmORM, RatingORM, ReviewORM
+                                 MyFilmsMenu, Navigation, get_keyboard)
+from database.orm import (UserORM, FilmORM, FilmStatsORM, RatingORM,
+                          ReviewORM)
 from states.states import (FSMMainMenu, FSMRateFilmMenu, FSMMyFilmsMenu,
                            FSMStartMenu, FSMReviewFilmMenu, help_state)
-from states.state_management import StateLinkedList
+from states.state_management import StateHistory
 
 router = Router()
 logger = logging.getLogger(__name__)
-state_list = StateLinkedList()
 
 
 # Класс, содержащий обработчики для команды /start
@@ -32,14 +37,14 @@ class StartCommandHandler:
         tg_id = int(message.from_user.id)
         user_name = message.from_user.full_name
         # Добавляем пользователя в БД
-        UserORM.set_user(tg_id, user_name)
+        await UserORM.set_user(tg_id, user_name)
         # Определяем текущее состояние
         current_state = FSMStartMenu.start_menu
-        # Добавляем текущее состояние в список состояний
-        state_list.add_state(current_state)
+        # Начинаем новую историю состояний с текущего состояния
+        await StateHistory.reset(state, current_state)
         # Подготавливаем данные для формирования ответа
         text = LEXICON[message.text]
-        reply_markup = StartMenu.create_start_menu_kb
+        reply_markup = 'start_menu'
         # Добавляем данные в словарь с данными для ответа
         message_data = {'text': text, 'reply_markup': reply_markup}
         # Добавляем словарь с данными для ответа в словарь с
@@ -53,7 +58,7 @@ class StartCommandHandler:
         # Отправляем ответ пользователю
         await message.answer(
             text=text,
-            reply_markup=reply_markup())
+            reply_markup=get_keyboard(reply_markup))
 
 
 class HelpCommandHandler:
@@ -61,9 +66,9 @@ class HelpCommandHandler:
                     ~StateFilter(help_state))
     async def process_help_command(message: Message, state: FSMContext):
         # Текущее состояние
-        current_state = state_list.get_current_state_str()
-        # Добавляем в односвязный список состояний текущее состояние
-        state_list.add_state(current_state)
+        current_state = await state.get_state()
+        # Добавляем в историю состояний текущее состояние
+        await StateHistory.add_state(state, current_state)
         # Устанавливаем текущее состояние
         await state.set_state(current_state)
 
@@ -82,16 +87,16 @@ class NavigationCommandHandler:
         # Получаем словарь из MemoryStorage()
         storage_data = await state.get_data()
         # Получаем предыдущее состояние пользователя
-        state_list.go_back()
-        prev_state = state_list.get_current_state_str()
+        prev_state = await StateHistory.go_back(state)
+        if prev_state is None:
+            await callback.answer()
+            return
         # Получаем данные для отправки сообщения
-        message_data = list(
-            storage_data.get(
-                prev_state.split(':')[1]).get('message_data').values())
-        text, reply_markup_ref = message_data[:2]
-        reply_markup_arg = message_data[-1] if len(message_data) > 2 else None
-        reply_markup_to_use = (reply_markup_ref(reply_markup_arg)
-                               if reply_markup_arg else reply_markup_ref())
+        message_data = storage_data.get(
+            prev_state.split(':')[1]).get('message_data')
+        text = message_data['text']
+        reply_markup_to_use = get_keyboard(message_data['reply_markup'],
+                                           message_data.get('cached_data'))
 
         # Отправляем клавиатуру из прошлого состояния
         await callback.message.edit_text(
@@ -109,15 +114,17 @@ class NavigationCommandHandler:
         storage_data = await state.get_data()
         # Получаем данные для отправки ответа
         message_data = storage_data['start_menu']['message_data']
-        text, reply_markup = message_data.values()
+        text, reply_markup = message_data['text'], message_data['reply_markup']
 
         # Отправляем ответ из меню старта
         await callback.message.edit_text(
             text=text,
-            reply_markup=reply_markup()
+            reply_markup=get_keyboard(reply_markup)
         )
 
         # Возвращаем пользователя в состояние стартового меню
+        # и начинаем историю состояний заново
+        await StateHistory.reset(state, FSMStartMenu.start_menu)
         await state.set_state(FSMStartMenu.start_menu)
 
     # Этот хэндлер будет срабатывать при нажатии кнопки "Главное меню"
@@ -129,18 +136,17 @@ class NavigationCommandHandler:
                                       state: FSMContext = None):
         # Текст над клавиатурой
         text = 'Главное меню'
-        # Ссылка на клавиатуру
-        reply_markup = MainMenu.create_main_menu_kb
+        # Идентификатор клавиатуры
+        reply_markup = 'main_menu'
         # Данные для формирования ответа пользователю
         message_data = {'text': text, 'reply_markup': reply_markup}
 
         # Данные текущего состояния
         state_data = {'message_data': message_data}
 
-        # Добавляем состояние главного меню в список состояний,
-        # если его там нет
+        # Добавляем состояние главного меню в историю состояний
         current_state = FSMMainMenu.main_menu
-        state_list.add_state(current_state)
+        await StateHistory.add_state(state, current_state)
 
         # Добавляем в хранилище данные текущего состония
         await state.update_data(main_menu=state_data)
@@ -185,8 +191,8 @@ class RatingReviewFilmMenuHandler:
         text_word = text_words.get(menu_name.split('_')[0])
         # Текст над клавиатурой
         text = f'Пришлите название фильма для {text_word}'
-        # Ссылка на клавиатуру
-        reply_markup = Navigation.create_navigation_kb
+        # Идентификатор клавиатуры
+        reply_markup = 'navigation'
         # Данные для формирования ответа пользователю
         message_data = {'text': text, 'reply_markup': reply_markup}
 
@@ -199,8 +205,8 @@ class RatingReviewFilmMenuHandler:
         else:
             # Текущее состояние
             current_state = FSMReviewFilmMenu.send_title
-        # Добавляем в односвязный список состояний текущее состояние
-        state_list.add_state(current_state)
+        # Добавляем в историю состояний текущее состояние
+        await StateHistory.add_state(state, current_state)
         # Добавляем в хранилище данные текущего состония
         await state.update_data(send_title=state_data)
         # Устанавливаем текущее состояние
@@ -210,14 +216,14 @@ class RatingReviewFilmMenuHandler:
             # Отправляем ответ пользователюи
             await update.message.edit_text(
                 text=text,
-                reply_markup=reply_markup()
+                reply_markup=get_keyboard(reply_markup)
             )
             await update.answer()
         elif isinstance(update, Message):
             # Отправляем ответ пользователюи
             await update.answer(
                 text=text,
-                reply_markup=reply_markup()
+                reply_markup=get_keyboard(reply_markup)
             )
 
     # Этот хэндлер будет срабатывать на текст с названием фильма
@@ -225,7 +231,7 @@ class RatingReviewFilmMenuHandler:
     @router.message(StateFilter(FSMRateFilmMenu.send_title,
                                 FSMReviewFilmMenu.send_title))
     async def process_film_title_sent(message: Message, state: FSMContext):
-        prev_state = state_list.get_current_state_str()
+        prev_state = await StateHistory.get_current_state_str(state)
         # Название поискового запроса
         query_title = message.text
         # Данные из хранилища
@@ -238,42 +244,45 @@ class RatingReviewFilmMenuHandler:
                 'cached_data', {})
         # Текст над клавиатурой
         text = 'Выберите фильм'
-        # Ссылка на клавиатуру
-        reply_markup = RateReviewFilmMenu.create_suggestions_menu_kb
+        # Идентификатор клавиатуры
+        reply_markup = 'suggestions_menu'
         # Данные для формирования ответа пользователю
         message_data = {'text': text, 'reply_markup': reply_markup}
 
         # Проверяем есть ли строка с поисковым запросом в
         # в ключах словаря с кэшированными данными текущего состояния
-        if query_title in cached_data.keys():
-            # Добавляем текущий поисковый запрос в кэшированные данные,
-            # чтобы в дальнейшем доставать по нему кэшированные
-            # предложения из Википедии
-            cached_data['current_query_title'] = query_title
-        else:
+        if query_title not in cached_data.keys():
             # Получаем результаты поиска в Википедии
-            suggestions = search_films(query_title)
-            if suggestions:
-                # Добавляем связку "поисковый запрос -
-                # предложения из Википедии"
-                cached_data.setdefault(query_title, suggestions)
-                # Добавляем текущий поисковый запрос в кэшированные данные,
-                # чтобы в дальнейшем доставать по нему кэшированные
-                # предложения из Википедии
-                cached_data['current_query_title'] = query_title
-                # Добавляем в словарь с данными для
-                # формирования ответа кэшированные данные
-                message_data.setdefault('cached_data', cached_data)
-                # Добавляем в словарь с данными текущего состояния данные для
-                # отправки сообщения
-                state_data = {'message_data': message_data}
-                # Добавляем в хранилизе данные текущего состояния
-                await state.update_data(select_suggestion=state_data)
-            else:
+            suggestions = await search_films(query_title)
+            if not suggestions:
                 await message.answer(
                     text='Изивините, по вашему запросу ничего не найдено\n'
                          'Попробуйте еще раз')
                 return
+            # Добавляем связку "поисковый запрос -
+            # предложения из Википедии"
+            cached_data.setdefault(query_title, suggestions)
+
+        # Добавляем текущий поисковый запрос в кэшированные данные,
+        # чтобы в дальнейшем доставать по нему кэшированные
+        # предложения из Википедии
+        cached_data['current_query_title'] = query_title
+        # Номер запроса передается в кнопки с предложениями, чтобы
+        # нажатие на кнопку под ответом на прошлый запрос не выбрало
+        # фильм из предложений текущего запроса
+        cached_data['query_token'] = cached_data.get('query_token', 0) + 1
+        # В каталоге и в предложениях хранятся полные ссылки на Википедию,
+        # в кнопки попадают их сокращенные версии
+        cached_data['short_links'] = await shorten_urls(
+            list(cached_data[query_title].values()))
+        # Добавляем в словарь с данными для
+        # формирования ответа кэшированные данные
+        message_data['cached_data'] = cached_data
+        # Добавляем в словарь с данными текущего состояния данные для
+        # отправки сообщения
+        state_data = {'message_data': message_data}
+        # Добавляем в хранилизе данные текущего состояния
+        await state.update_data(select_suggestion=state_data)
 
         if prev_state == 'FSMRateFilmMenu:send_title':
             # Определяем текущее состояние
@@ -281,38 +290,47 @@ class RatingReviewFilmMenuHandler:
         else:
             # Определяем текущее состояние
             current_state = FSMReviewFilmMenu.select_suggestion
-        # Добавляем в односвязный список состояний текущее состояние
-        state_list.add_state(current_state)
+        # Добавляем в историю состояний текущее состояние
+        await StateHistory.add_state(state, current_state)
         # Устанавливаем текущее состояние
         await state.set_state(current_state)
 
         # Отправляем ответ пользователю
         await message.answer(
             text=text,
-            reply_markup=reply_markup(cached_data)
+            reply_markup=get_keyboard(reply_markup, cached_data)
         )
 
     # Этот хэндлер будет срабатывать при нажатии
     # на кнопку с предложенным фильмом
     @router.callback_query(StateFilter(FSMRateFilmMenu.select_suggestion,
                                        FSMReviewFilmMenu.select_suggestion,),
-                           F.data.startswith('suggestion-'))
+                           SuggestionCallback.filter())
     async def process_suggestion_press(callback: CallbackQuery,
+                                       callback_data: SuggestionCallback,
                                        state: FSMContext):
-        prev_state = state_list.get_current_state_str()
-        # Данные фильма
-        selected_title = callback.data.split('suggestion-')[1]
+        prev_state = await StateHistory.get_current_state_str(state)
         storage_data = await state.get_data()
         cached_data = (storage_data['select_suggestion']
                        ['message_data']['cached_data'])
+        # Кнопка осталась под ответом на один из прошлых запросов
+        if callback_data.token != cached_data.get('query_token'):
+            await callback.answer(
+                text='Этот список устарел, выберите фильм из последнего')
+            return
         current_query_title = cached_data['current_query_title']
-        wiki_link = cached_data[current_query_title][selected_title]
+        # Данные фильма по номеру предложения
+        suggestions = list(cached_data[current_query_title].items())
+        if not 0 <= callback_data.index < len(suggestions):
+            await callback.answer()
+            return
+        selected_title, wiki_link = suggestions[callback_data.index]
         film_data = {'title': selected_title, 'wiki_link': wiki_link}
 
         if prev_state == 'FSMRateFilmMenu:select_suggestion':
             # Данные для отправки сообщения
             text = 'Отправьте оценку'
-            reply_markup = RateReviewFilmMenu.create_ratings_menu_kb
+            reply_markup = 'ratings_menu'
             message_data = {'text': text, 'reply_markup': reply_markup}
             # Определяем текущее состояние
             current_state = FSMRateFilmMenu.send_rating
@@ -323,7 +341,7 @@ class RatingReviewFilmMenuHandler:
         else:
             # Данные для отправки сообщения
             text = 'Отправьте текст рецензии'
-            reply_markup = Navigation.create_navigation_kb
+            reply_markup = 'navigation'
             message_data = {'text': text, 'reply_markup': reply_markup}
             # Определяем текущее состояние
             current_state = FSMReviewFilmMenu.send_review
@@ -332,14 +350,14 @@ class RatingReviewFilmMenuHandler:
             # Добавляем данные текущего состояния в хранилище
             await state.update_data(send_review=state_data)
 
-        # Добавляем текущее состояние в список состояний
-        state_list.add_state(current_state)
+        # Добавляем текущее состояние в историю состояний
+        await StateHistory.add_state(state, current_state)
         # Устанавливаем текущее состояние
         await state.set_state(current_state)
 
         await callback.message.edit_text(
             text=text,
-            reply_markup=reply_markup()
+            reply_markup=get_keyboard(reply_markup)
         )
         await callback.answer()
 
@@ -348,26 +366,33 @@ class RatingReviewFilmMenuHandler:
                                        FSMRateFilmMenu.rate_submit),
                            IsRating())
     async def process_film_rating_sent(callback: CallbackQuery,
+                                       callback_data: RatingCallback,
                                        state: FSMContext):
         # Получаем id пользователя
-        user_id = UserORM.get_user_id(int(callback.from_user.id))
+        user_id = await UserORM.get_user_id(int(callback.from_user.id))
         # Сохраняем в переменную оценку из апдейта
-        new_rating = int(callback.data.split('rating-')[1])
+        new_rating = callback_data.value
 
         # Получаем данные для отправки в базу данных
         storage_data = await state.get_data()
-        film_data = storage_data['send_rating']['film_data']
-        title, wiki_link = film_data.values()
-
-        # Отправляем название фильма, ссылку и оценку
-        # в базу данных
-        film_id = FilmORM.get_or_create_film(title, wiki_link)
-        RatingORM.set_or_update_rating(user_id, film_id, new_rating)
+        send_rating_data = storage_data['send_rating']
+        film_id = send_rating_data.get('film_id')
+        if film_id is None:
+            # Отправляем название фильма и ссылку в базу данных
+            # при первой оценке и запоминаем id фильма
+            title, wiki_link = send_rating_data['film_data'].values()
+            film_id = await FilmORM.get_or_create_film(title, wiki_link)
+            await state.update_data(
+                send_rating={**send_rating_data, 'film_id': film_id})
+
+        # Добавляем оценку в буфер, который запишет в базу данных
+        # только последнюю оценку пользователя
+        await rating_buffer.add(user_id, film_id, new_rating)
 
         # Определяем текущее состояние
         current_state = FSMRateFilmMenu.rate_submit
-        # Добавляем текущее состояние в список состояний
-        state_list.add_state(current_state)
+        # Добавляем текущее состояние в историю состояний
+        await StateHistory.add_state(state, current_state)
         # Устанавливаем текущее состояние
         await state.set_state(current_state)
 
@@ -380,10 +405,13 @@ class RatingReviewFilmMenuHandler:
                            StateFilter(FSMRateFilmMenu.rate_submit))
     async def process_rate_submit_press(callback: CallbackQuery,
                                         state: FSMContext):
+        # Записываем накопленные оценки пользователя в базу данных
+        user_id = await UserORM.get_user_id(int(callback.from_user.id))
+        await rating_buffer.flush_user(user_id)
         # Определяем текущее состояние
         current_state = FSMMainMenu.main_menu
-        # Добавляем текущее состояние в список состояний
-        state_list.add_state(current_state)
+        # Добавляем текущее состояние в историю состояний
+        await StateHistory.add_state(state, current_state)
         # Устанавливаем текущее состояние
         await state.set_state(current_state)
 
@@ -404,8 +432,8 @@ class RatingReviewFilmMenuHandler:
         current_state = FSMReviewFilmMenu.submit_or_edit_review
         # Добавляем данные текущего состояния в хранилище
         await state.update_data(submit_or_edit_review=state_data)
-        # Добавляем в односвязный список состояний текущее состояние
-        state_list.add_state(current_state)
+        # Добавляем в историю состояний текущее состояние
+        await StateHistory.add_state(state, current_state)
         # Устанавливаем текущее состояние
         await state.set_state(current_state)
 
@@ -423,7 +451,7 @@ class RatingReviewFilmMenuHandler:
                                         state: FSMContext):
         # Данные для отправки сообщения
         text = 'Отправьте рецензию'
-        reply_markup = Navigation.create_navigation_kb
+        reply_markup = 'navigation'
         # Определяем текущее состояние
         current_state = FSMReviewFilmMenu.send_review
         # Устанавливаем текущее состояние
@@ -431,7 +459,7 @@ class RatingReviewFilmMenuHandler:
 
         await callback.message.edit_text(
             text=text,
-            reply_markup=reply_markup()
+            reply_markup=get_keyboard(reply_markup)
         )
 
     # Этот хэндлер будет срабатывать на кнопку "Подтвердить"
@@ -442,7 +470,7 @@ class RatingReviewFilmMenuHandler:
     async def process_submit_review_press(callback: CallbackQuery,
                                           state: FSMContext):
         # Получаем id пользователя
-        user_id = UserORM.get_user_id(int(callback.from_user.id))
+        user_id = await UserORM.get_user_id(int(callback.from_user.id))
         # Получаем данные из хранлища
         storage_data = await state.get_data()
         # Получаем текст рецензии из состояния
@@ -456,13 +484,13 @@ class RatingReviewFilmMenuHandler:
 
         # Отправляем название фильма, ссылку и рецензию
         # в базу данных
-        film_id = FilmORM.get_or_create_film(title, wiki_link)
-        ReviewORM.set_review(user_id, film_id, review_text)
+        film_id = await FilmORM.get_or_create_film(title, wiki_link)
+        await ReviewORM.set_review(user_id, film_id, review_text)
 
         # Определяем текущее состояние
         current_state = FSMMainMenu.main_menu
-        # Добавляем текущее состояние в список состояний
-        state_list.add_state(current_state)
+        # Добавляем текущее состояние в историю состояний
+        await StateHistory.add_state(state, current_state)
         # Устанавливаем текущее состояние
         await state.set_state(current_state)
 
@@ -477,39 +505,186 @@ class RatingReviewFilmMenuHandler:
 # Класс, содержащий обработчики для команды /my_films
 class MyFilmsMenuHandler:
     # Этот хэндлер будет срабатывать на команду /my_films
+    # и на кнопку "Мои фильмы" в главном меню
     @router.message(Command(commands='my_films'),
                     StateFilter(FSMMainMenu.main_menu))
-    async def process_my_films_command(message: Message, state: FSMContext):
-        await message.answer(
-            text='Выберите категорию',
-            reply_markup=MyFilmsMenu.create_my_films_menu_kb()
-        )
-        await state.set_state(FSMMyFilmsMenu.my_films)
+    @router.callback_query(F.data == 'my_films',
+                           StateFilter(FSMMainMenu.main_menu))
+    async def process_my_films_command(update: Message | CallbackQuery,
+                                       state: FSMContext):
+        # Текст над клавиатурой
+        text = 'Выберите категорию'
+        # Идентификатор клавиатуры
+        reply_markup = 'my_films_menu'
+        # Данные текущего состояния
+        state_data = {'message_data': {'text': text,
+                                       'reply_markup': reply_markup}}
+
+        current_state = FSMMyFilmsMenu.my_films
+        # Добавляем в историю состояний текущее состояние
+        await StateHistory.add_state(state, current_state)
+        # Добавляем в хранилище данные текущего состония
+        await state.update_data(my_films=state_data)
+        # Устанавливаем текущее состояние
+        await state.set_state(current_state)
+
+        if isinstance(update, CallbackQuery):
+            await update.message.edit_text(
+                text=text,
+                reply_markup=get_keyboard(reply_markup)
+            )
+            await update.answer()
+        else:
+            await update.answer(
+                text=text,
+                reply_markup=get_keyboard(reply_markup)
+            )
 
     # Этот хэндлер будет срабатывать при нажатии на кнопку "Все фильмы"
     @router.callback_query(StateFilter(FSMMyFilmsMenu.my_films),
                            F.data == 'all_films')
     async def process_all_films_press(callback: CallbackQuery,
                                       state: FSMContext):
-        films = FilmORM.get_all_films()
+        user_id = await UserORM.get_user_id(int(callback.from_user.id))
+        films, has_prev, has_next = await FilmORM.get_user_films(user_id)
 
         if films:
             await callback.message.edit_text(
                 text='Список ваших фильмов',
-                reply_markup=MyFilmsMenu.create_all_my_films_menu_kb(films)
+                reply_markup=MyFilmsMenu.create_all_my_films_menu_kb(
+                    films, has_prev, has_next)
             )
             await callback.answer()
         else:
             await callback.answer('У вас пока нет фильмов')
 
+    # Этот хэндлер будет срабатывать на кнопки перехода между
+    # страницами в категории "Все фильмы"
+    @router.callback_query(StateFilter(FSMMyFilmsMenu.my_films),
+                           FilmsPageCallback.filter())
+    async def process_films_page_press(callback: CallbackQuery,
+                                       callback_data: FilmsPageCallback):
+        user_id = await UserORM.get_user_id(int(callback.from_user.id))
+        if callback_data.forward:
+            films, has_prev, has_next = await FilmORM.get_user_films(
+                user_id, after_id=callback_data.film_id)
+        else:
+            films, has_prev, has_next = await FilmORM.get_user_films(
+                user_id, before_id=callback_data.film_id)
+
+        if films:
+            await callback.message.edit_reply_markup(
+                reply_markup=MyFilmsMenu.create_all_my_films_menu_kb(
+                    films, has_prev, has_next)
+            )
+        await callback.answer()
+
+    # Этот хэндлер будет срабатывать при нажатии на кнопку
+    # "Фильмы по оценкам" и на кнопки перехода между страницами
+    # в этой категории
+    @router.callback_query(StateFilter(FSMMyFilmsMenu.my_films),
+                           F.data == 'films_by_rating')
+    @router.callback_query(StateFilter(FSMMyFilmsMenu.my_films),
+                           RatedPageCallback.filter())
+    async def process_films_by_rating_press(
+            callback: CallbackQuery,
+            callback_data: RatedPageCallback | None = None):
+        user_id = await UserORM.get_user_id(int(callback.from_user.id))
+        if callback_data is None:
+            films, has_prev, has_next = \
+                await RatingORM.get_user_films_by_rating(user_id)
+        else:
+            cursor = (callback_data.rating, callback_data.film_id)
+            if callback_data.forward:
+                films, has_prev, has_next = \
+                    await RatingORM.get_user_films_by_rating(user_id,
+                                                             after=cursor)
+            else:
+                films, has_prev, has_next = \
+                    await RatingORM.get_user_films_by_rating(user_id,
+                                                             before=cursor)
+
+        if not films:
+            await callback.answer('У вас пока нет оценок')
+            return
+
+        # Группируем фильмы на странице по оценкам
+        lines = ['Ваши фильмы по оценкам']
+        current_rating = None
+        for _, title, rating in films:
+            if rating != current_rating:
+                current_rating = rating
+                lines.append(f'\n<b>{rating}</b>')
+            lines.append(f'• {html.quote(title)}')
+
+        await callback.message.edit_text(
+            text='\n'.join(lines),
+            reply_markup=MyFilmsMenu.create_films_by_rating_menu_kb(
+                films, has_prev, has_next)
+        )
+        await callback.answer()
+
+    # Этот хэндлер будет срабатывать при нажатии на кнопку "Поиск фильмов"
+    @router.callback_query(StateFilter(FSMMyFilmsMenu.my_films),
+                           F.data == 'search_my_films')
+    async def process_search_my_films_press(callback: CallbackQuery,
+                                            state: FSMContext):
+        await state.set_state(FSMMyFilmsMenu.search_my_films)
+        await callback.message.edit_text(
+            text='Пришлите название фильма для поиска',
+            reply_markup=Navigation.create_navigation_kb()
+        )
+        await callback.answer()
+
+    # Этот хэндлер будет срабатывать на текст с названием фильма
+    # после нажатия на кнопку "Поиск фильмов"
+    @router.message(StateFilter(FSMMyFilmsMenu.search_my_films))
+    async def process_my_films_query_sent(message: Message,
+                                          state: FSMContext):
+        user_id = await UserORM.get_user_id(int(message.from_user.id))
+        films = await FilmORM.search_user_films(user_id, message.text)
+
+        if not films:
+            await message.answer(
+                text='Среди ваших фильмов ничего не найдено\n'
+                     'Попробуйте еще раз')
+            return
+
+        # Возвращаем пользователя в меню моих фильмов, чтобы
+        # работали кнопки с найденными фильмами
+        await state.set_state(FSMMyFilmsMenu.my_films)
+        await message.answer(
+            text='Найденные фильмы',
+            reply_markup=MyFilmsMenu.create_all_my_films_menu_kb(films)
+        )
+
     # Этот хэндлер будет срабатывать на нажатие фильма в категории "Все фильмы"
     @router.callback_query(StateFilter(FSMMyFilmsMenu.my_films),
-                           F.data.startswith('my_film-'))
-    async def process_my_film_press(callback: CallbackQuery):
-        film_id = int(callback.data.split('my_film-')[1])
-        title = FilmORM.get_film(film_id).title
+                           FilmCallback.filter())
+    async def process_my_film_press(callback: CallbackQuery,
+                                    callback_data: FilmCallback):
+        film_id = callback_data.film_id
+        film = await FilmORM.get_film(film_id)
+        # Кнопка могла остаться под старым сообщением с удаленным фильмом
+        if film is None:
+            await callback.answer(text='Фильм не найден')
+            return
+        title = film.title
+        # Оценка сообщества читается из готовой статистики фильма
+        stats = await FilmStatsORM.get_film_stats(film_id)
+        lines = [f'<b>{html.quote(title)}</b>\n']
+        if stats is None or not stats.ratings_count:
+            lines.append('Оценок пока нет')
+        else:
+            lines.append(f'Средняя оценка: {stats.avg_rating:.1f} '
+                         f'(оценок: {stats.ratings_count})')
+            # Распределение оценок от высшей к низшей
+            lines.extend(f'{score}: {count}'
+                         for score, count in reversed(
+                             list(enumerate(stats.histogram)))
+                         if count)
         await callback.message.edit_text(
-            text=title,
+            text='\n'.join(lines),
             reply_markup=MyFilmsMenu.create_film_info_menu_kb()
         )
         await callback.answer()
@@ -0,0 +1,42 @@
+from aiogram.filters.callback_data import CallbackData
+
+# Короткие префиксы и числовые поля, чтобы callback_data всегда
+# помещалась в 64 байта, которые допускает Telegram
+
+
+# Выбор фильма из предложений: номер поискового запроса пользователя
+# и номер предложения в списке результатов этого запроса
+class SuggestionCallback(CallbackData, prefix='s'):
+    token: int
+    index: int
+
+
+# Оценка фильма
+class RatingCallback(CallbackData, prefix='r'):
+    value: int
+
+
+# Фильм из библиотеки пользователя
+class FilmCallback(CallbackData, prefix='f'):
+    film_id: int
+
+
+# Страница меню "Все фильмы": вперед после film_id или назад перед ним
+class FilmsPageCallback(CallbackData, prefix='fp'):
+    forward: bool
+    film_id: int
+
+
+# Страница меню "Фильмы по оценкам": вперед после пары
+# (rating, film_id) или назад перед ней
+class RatedPageCallback(CallbackData, prefix='rp'):
+    forward: bool
+    rating: int
+    film_id: int
+
+
+# Список /top: лучшие или самые оцениваемые фильмы
+# за последние window дней (0 - за все время)
+class TopCallback(CallbackData, prefix='t'):
+    most_rated: bool
+    window: int
@@ -1,10 +1,23 @@
+from functools import cache, lru_cache
+from typing import Any, Callable
+
 from aiogram import Bot
 from aiogram.types import (InlineKeyboardButton,
                            InlineKeyboardMarkup, BotCommand)
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from keyboards.callback_data import (FilmCallback, FilmsPageCallback,
+                                     RatedPageCallback, RatingCallback,
+                                     SuggestionCallback, TopCallback)
 from lexicon.lexicon import LEXICON_COMMANDS
 
+# Клавиатуры без аргументов создаются один раз, клавиатуры с аргументами
+# кэшируются по значениям аргументов. Клавиатура предложений не кэшируется:
+# токен запроса в ней уникален для каждого поиска. Готовые клавиатуры
+# общие для всех апдейтов, поэтому изменять их нельзя.
+# Размер кэша для клавиатур, которые зависят от аргументов
+KEYBOARD_CACHE_SIZE = 1024
+
 
 # Класс для работы с кнопками
 class Buttons:
@@ -46,6 +59,7 @@ class Generator:
 class StartMenu:
     # Функция, создающая клавиатуру стартового меню
     @staticmethod
+    @cache
     def create_start_menu_kb():
         start_btn = [
             [Generator.create_button(
@@ -60,6 +74,7 @@ class StartMenu:
 class MainMenu:
     # Функция, создающая клавиатуру главного меню
     @staticmethod
+    @cache
     def create_main_menu_kb() -> InlineKeyboardMarkup:
         buttons = [
             [Generator.create_button('Оценить фильм', 'rate_film'),
@@ -73,17 +88,25 @@ class MainMenu:
 # Класс, внутри которого клавиатуры
 # для меню "Оценить фильм" и "Написать рецензию"
 class RateReviewFilmMenu:
-    # Функция, создающая клавиатуру для предложений из Википедии
+    # Функция, создающая клавиатуру для предложений из Википедии.
+    # В кнопки входит токен запроса, который у каждого поиска свой,
+    # поэтому эта клавиатура не кэшируется
     @staticmethod
     def create_suggestions_menu_kb(
             suggestions_data: dict) -> InlineKeyboardMarkup:
-        title = suggestions_data['current_query_title']
+        query_title = suggestions_data['current_query_title']
+        token = suggestions_data.get('query_token', 0)
+        short_links = suggestions_data.get('short_links', {})
         buttons: list[list[InlineKeyboardButton]] = []
-        for title, link in suggestions_data[title].items():
+        for index, (title, link) in enumerate(
+                suggestions_data[query_title].items()):
             suggestion_button = Generator.create_button(
-                text=title, callback_data=f'suggestion-{title}')
+                text=title,
+                callback_data=SuggestionCallback(token=token,
+                                                 index=index).pack())
             link_button = Generator.create_button(
-                text='Ссылка на фильм', url=link, callback_data=None)
+                text='Ссылка на фильм', url=short_links.get(link, link),
+                callback_data=None)
             buttons.append([suggestion_button])
             buttons.append([link_button])
         buttons.append(Buttons.create_navigation_buttons())
@@ -92,13 +115,15 @@ class RateReviewFilmMenu:
 
     # Функция, создающая клавиатуру с оценками
     @staticmethod
+    @cache
     def create_ratings_menu_kb() -> InlineKeyboardMarkup:
         submit_btn = Generator.create_button(
             text='Подтвердить', callback_data='submit_rate'
         )
         buttons = [[Generator.create_button(
             str(rating),
-            f'rating-{rating}') for rating in reversed(range(11))],
+            RatingCallback(value=rating).pack())
+            for rating in reversed(range(11))],
             [submit_btn],
             Buttons.create_navigation_buttons()
             ]
@@ -106,6 +131,7 @@ class RateReviewFilmMenu:
 
     # Функция, создающая клавиатуру с рецензией
     @staticmethod
+    @cache
     def create_review_menu_kb() -> InlineKeyboardMarkup:
         edit_btn = Generator.create_button(
             text='Изменить', callback_data='edit_review'
@@ -124,6 +150,7 @@ class RateReviewFilmMenu:
 class MyFilmsMenu:
     # Функция, создающая клавиатуру для меню с моими фильмами
     @staticmethod
+    @cache
     def create_my_films_menu_kb() -> InlineKeyboardMarkup:
         buttons = [
             [Generator.create_button('Все фильмы', 'all_films'),
@@ -133,22 +160,86 @@ class MyFilmsMenu:
         ]
         return Generator.create_keyboard(buttons, 2)
 
-    # Функция, создающая клавиатуру для меню со всеми фильмами
+    # Функция, создающая клавиатуру для страницы меню со всеми фильмами
     @staticmethod
     def create_all_my_films_menu_kb(
-            films: dict[int, str]) -> InlineKeyboardMarkup:
+            films: list[tuple[int, str, int | None]],
+            has_prev: bool = False,
+            has_next: bool = False) -> InlineKeyboardMarkup:
+        return MyFilmsMenu._create_all_my_films_menu_kb(
+            tuple(films), has_prev, has_next)
+
+    @staticmethod
+    @lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+    def _create_all_my_films_menu_kb(
+            films: tuple[tuple[int, str, int | None], ...],
+            has_prev: bool,
+            has_next: bool) -> InlineKeyboardMarkup:
         buttons = [
             [Generator.create_button(
-                title,
-                f'my_film-{film_id}') for film_id, title in films.items()
-             ],
-            Buttons.create_navigation_buttons()
+                f'{title} ({rating})' if rating is not None else title,
+                FilmCallback(film_id=film_id).pack())]
+            for film_id, title, rating in films
         ]
+        # Кнопки перехода между страницами
+        page_buttons = []
+        if has_prev:
+            page_buttons.append(Generator.create_button(
+                '⬅️', FilmsPageCallback(forward=False,
+                                        film_id=films[0][0]).pack()))
+        if has_next:
+            page_buttons.append(Generator.create_button(
+                '➡️', FilmsPageCallback(forward=True,
+                                        film_id=films[-1][0]).pack()))
+        if page_buttons:
+            buttons.append(page_buttons)
+        buttons.append(Buttons.create_navigation_buttons())
+
+        return Generator.create_keyboard(buttons, 2)
+
+    # Функция, создающая клавиатуру для страницы меню с фильмами,
+    # отсортированными по оценкам
+    @staticmethod
+    def create_films_by_rating_menu_kb(
+            films: list[tuple[int, str, int]],
+            has_prev: bool = False,
+            has_next: bool = False) -> InlineKeyboardMarkup:
+        return MyFilmsMenu._create_films_by_rating_menu_kb(
+            tuple(films), has_prev, has_next)
+
+    @staticmethod
+    @lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+    def _create_films_by_rating_menu_kb(
+            films: tuple[tuple[int, str, int], ...],
+            has_prev: bool,
+            has_next: bool) -> InlineKeyboardMarkup:
+        buttons = [
+            [Generator.create_button(f'{title} ({rating})',
+                                     FilmCallback(film_id=film_id).pack())]
+            for film_id, title, rating in films
+        ]
+        # Кнопки перехода между страницами. В callback_data передается
+        # пара (оценка, id фильма) первого или последнего фильма на странице
+        page_buttons = []
+        if has_prev:
+            film_id, _, rating = films[0]
+            page_buttons.append(Generator.create_button(
+                '⬅️', RatedPageCallback(forward=False, rating=rating,
+                                        film_id=film_id).pack()))
+        if has_next:
+            film_id, _, rating = films[-1]
+            page_buttons.append(Generator.create_button(
+                '➡️', RatedPageCallback(forward=True, rating=rating,
+                                        film_id=film_id).pack()))
+        if page_buttons:
+            buttons.append(page_buttons)
+        buttons.append(Buttons.create_navigation_buttons())
 
         return Generator.create_keyboard(buttons, 2)
 
     # Функция, создающая клавиатуру для меню с информацией о фильме
     @staticmethod
+    @cache
     def create_film_info_menu_kb() -> InlineKeyboardMarkup:
         buttons = [
             [Generator.create_button('Оценка', 'my_film_rating'),
@@ -160,10 +251,43 @@ class MyFilmsMenu:
         return Generator.create_keyboard(buttons, 2)
 
 
+# Класс, внутри которого клавиатуры для списков /top
+class TopMenu:
+    # Функция, возвращающая подпись окна списка
+    @staticmethod
+    def window_label(window: int) -> str:
+        return f'за {window} дн.' if window else 'за все время'
+
+    # Функция, создающая клавиатуру для переключения между списками.
+    # Текущий список отмечен точкой
+    @staticmethod
+    @lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+    def create_top_menu_kb(most_rated: bool, window: int,
+                           windows: tuple[int, ...]) -> InlineKeyboardMarkup:
+        def mark(text: str, selected: bool) -> str:
+            return f'• {text}' if selected else text
+
+        buttons = [
+            [Generator.create_button(
+                mark('Лучшие', not most_rated),
+                TopCallback(most_rated=False, window=window).pack()),
+             Generator.create_button(
+                mark('Популярные', most_rated),
+                TopCallback(most_rated=True, window=window).pack())],
+            [Generator.create_button(
+                mark(TopMenu.window_label(item), item == window),
+                TopCallback(most_rated=most_rated, window=item).pack())
+             for item in windows],
+            Buttons.create_navigation_buttons()
+        ]
+        return Generator.create_keyboard(buttons, row_width=3)
+
+
 # Класс, внутри которого клавиатуры навигации
 class Navigation:
     # Функция, создающая клавиатуру для навигации
     @staticmethod
+    @cache
     def create_navigation_kb() -> InlineKeyboardMarkup:
         buttons = [
             Buttons.create_navigation_buttons()
@@ -171,6 +295,42 @@ class Navigation:
         return Generator.create_keyboard(buttons, row_width=2)
 
 
+# Словарь с идентификаторами клавиатур. В FSM-хранилище сохраняются
+# идентификаторы, а не ссылки на функции, чтобы данные состояний
+# можно было сериализовать
+KEYBOARDS: dict[str, Callable[..., InlineKeyboardMarkup]] = {
+    'start_menu': StartMenu.create_start_menu_kb,
+    'main_menu': MainMenu.create_main_menu_kb,
+    'suggestions_menu': RateReviewFilmMenu.create_suggestions_menu_kb,
+    'ratings_menu': RateReviewFilmMenu.create_ratings_menu_kb,
+    'review_menu': RateReviewFilmMenu.create_review_menu_kb,
+    'my_films_menu': MyFilmsMenu.create_my_films_menu_kb,
+    'all_my_films_menu': MyFilmsMenu.create_all_my_films_menu_kb,
+    'films_by_rating_menu': MyFilmsMenu.create_films_by_rating_menu_kb,
+    'film_info_menu': MyFilmsMenu.create_film_info_menu_kb,
+    'navigation': Navigation.create_navigation_kb
+}
+
+
+# Функция, возвращающая клавиатуру по ее идентификатору
+def get_keyboard(kb_id: str, kb_arg: Any = None) -> InlineKeyboardMarkup:
+    kb_factory = KEYBOARDS[kb_id]
+    return kb_factory(kb_arg) if kb_arg is not None else kb_factory()
+
+
+# Идентификаторы клавиатур, которые не зависят от аргументов
+STATIC_KEYBOARDS: tuple[str, ...] = (
+    'start_menu', 'main_menu', 'ratings_menu', 'review_menu',
+    'my_films_menu', 'film_info_menu', 'navigation'
+)
+
+
+# Функция, заранее создающая все клавиатуры без аргументов
+def build_static_keyboards() -> None:
+    for kb_id in STATIC_KEYBOARDS:
+        get_keyboard(kb_id)
+
+
 # Функция для настройки кнопки Menu бота
 async def set_default_main_menu(bot: Bot):
     default_main_menu_commands = [BotCommand(
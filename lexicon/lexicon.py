@@ -6,6 +6,9 @@ LEXICON: dict[str, str] = {
              '/rate_film - меню для оценки фильма\n'
              '/review_film - меню для написания рецензии к фильму\n'
              '/my_films - меню с вашими фильмами\n'
+             '/top - лучшие и популярные фильмы\n'
+             '/export - выгрузить оценки и рецензии (csv или jsonl)\n'
+             '/import - загрузить оценки и рецензии из файла\n'
              '/help - справка по работе бота'
 }
 
@@ -14,5 +17,8 @@ LEXICON_COMMANDS: dict[str, str] = {
     '/rate_film': 'меню для оценки фильма',
     '/review_film': 'меню для написания рецензии к фильму',
     '/my_films': 'меню с вашими фильмами',
+    '/top': 'лучшие и популярные фильмы',
+    '/export': 'выгрузить оценки и рецензии',
+    '/import': 'загрузить оценки и рецензии из файла',
     '/help': 'справка по работе бота'
 }
@@ -0,0 +1,110 @@
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from typing import AsyncIterator, BinaryIO
+
+from database.database import async_engine
+from database.migrations import MigrationORM
+from database.orm import UserORM
+from services.library_io import (LIBRARY_FORMATS, LibraryFormatError,
+                                 detect_format, export_library,
+                                 import_library)
+
+# Размер части файла, которая читается с диска за раз
+READ_CHUNK_SIZE = 64 * 1024
+
+
+# Функция, читающая файл по частям, не блокируя цикл событий
+async def _read_chunks(file: BinaryIO) -> AsyncIterator[bytes]:
+    while chunk := await asyncio.to_thread(file.read, READ_CHUNK_SIZE):
+        yield chunk
+
+
+# Функция, записывающая выгрузку пользователя в файл
+async def _export_to_file(user_id: int, fmt: str, file: BinaryIO) -> None:
+    async for chunk in export_library(user_id, fmt):
+        await asyncio.to_thread(file.write, chunk)
+
+
+async def _get_user_id(tg_id: int) -> int:
+    user_id = await UserORM.get_user_id(tg_id)
+    if user_id is None:
+        raise SystemExit(f'User with tg_id {tg_id} not found')
+    return user_id
+
+
+async def export_command(args: argparse.Namespace) -> None:
+    # Выгрузка всех пользователей: по файлу на пользователя
+    if args.all_users:
+        if args.output == '-':
+            raise SystemExit('--all-users requires --output directory')
+        os.makedirs(args.output, exist_ok=True)
+        for user_id, tg_id in await UserORM.get_users():
+            path = os.path.join(args.output, f'{tg_id}.{args.format}')
+            with open(path, 'wb') as file:
+                await _export_to_file(user_id, args.format, file)
+        return
+
+    if args.tg_id is None:
+        raise SystemExit('--tg-id or --all-users is required')
+    user_id = await _get_user_id(args.tg_id)
+    if args.output == '-':
+        await _export_to_file(user_id, args.format, sys.stdout.buffer)
+    else:
+        with open(args.output, 'wb') as file:
+            await _export_to_file(user_id, args.format, file)
+
+
+async def import_command(args: argparse.Namespace) -> None:
+    fmt = args.format or detect_format(args.input)
+    if fmt is None:
+        raise SystemExit('Cannot detect file format, use --format')
+    user_id = await _get_user_id(args.tg_id)
+    with open(args.input, 'rb') as file:
+        try:
+            result = await import_library(user_id, _read_chunks(file), fmt)
+        except LibraryFormatError as e:
+            raise SystemExit(f'Import failed: {e}')
+    print(f'ratings: {result.ratings}, reviews: {result.reviews}, '
+          f'skipped: {result.skipped}')
+    for error in result.errors:
+        print(error, file=sys.stderr)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Import and export user ratings and reviews')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export')
+    export_parser.add_argument('--tg-id', type=int)
+    export_parser.add_argument('--all-users', action='store_true',
+                               help='export every user into --output dir')
+    export_parser.add_argument('--format', choices=LIBRARY_FORMATS,
+                               default='csv')
+    export_parser.add_argument('--output', default='-')
+    export_parser.set_defaults(handler=export_command)
+
+    import_parser = subparsers.add_parser('import')
+    import_parser.add_argument('--tg-id', type=int, required=True)
+    import_parser.add_argument('--format', choices=LIBRARY_FORMATS)
+    import_parser.add_argument('input')
+    import_parser.set_defaults(handler=import_command)
+
+    return parser.parse_args()
+
+
+async def main() -> None:
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    await MigrationORM.migrate()
+    try:
+        await args.handler(args)
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+import time
+
+from aiohttp import web
+from prometheus_client import (CONTENT_TYPE_LATEST, Counter, Gauge,
+                               Histogram, generate_latest)
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Количество апдейтов по типу и состоянию пользователя
+UPDATES_TOTAL = Counter(
+    'bot_updates_total', 'Updates received by the dispatcher',
+    ['update_type', 'state'])
+# Время обработки апдейта целиком
+UPDATE_DURATION = Histogram(
+    'bot_update_duration_seconds', 'Time spent processing an update',
+    ['update_type'])
+# Апдейты, отброшенные из-за переполнения очереди на обработку
+UPDATES_DROPPED = Counter(
+    'bot_updates_dropped_total', 'Updates dropped because the queue is full',
+    ['update_type'])
+# Время работы отдельных хэндлеров
+HANDLER_DURATION = Histogram(
+    'bot_handler_duration_seconds', 'Time spent in a handler',
+    ['handler'])
+# Время выполнения запросов к базе данных
+DB_QUERY_DURATION = Histogram(
+    'bot_db_query_duration_seconds', 'Time spent executing SQL statements',
+    ['operation'],
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5))
+# Время запросов к внешним сервисам
+EXTERNAL_CALL_DURATION = Histogram(
+    'bot_external_call_duration_seconds', 'Time spent calling external APIs',
+    ['service', 'operation'])
+# Попадания и промахи кэшей
+CACHE_HITS = Gauge('bot_cache_hits', 'Cache hits', ['cache'])
+CACHE_MISSES = Gauge('bot_cache_misses', 'Cache misses', ['cache'])
+CACHE_SIZE = Gauge('bot_cache_size', 'Number of cached entries', ['cache'])
+
+
+# Функция, регистрирующая кэш для экспорта статистики.
+# Значения читаются из кэша в момент запроса метрик
+def register_cache(name: str, cache) -> None:
+    CACHE_HITS.labels(name).set_function(lambda: cache.hits)
+    CACHE_MISSES.labels(name).set_function(lambda: cache.misses)
+    CACHE_SIZE.labels(name).set_function(lambda: len(cache))
+
+
+# Функция, подключающая замер времени SQL-запросов к движку
+def instrument_engine(engine: AsyncEngine) -> None:
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters,
+                              context, executemany):
+        conn.info.setdefault('query_start_time', []).append(
+            time.perf_counter())
+
+    @event.listens_for(sync_engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters,
+                             context, executemany):
+        started = conn.info['query_start_time'].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper()
+        DB_QUERY_DURATION.labels(operation).observe(
+            time.perf_counter() - started)
+
+    # При ошибке запроса after_cursor_execute не вызывается
+    @event.listens_for(sync_engine, 'handle_error')
+    def handle_error(context):
+        if context.connection is not None:
+            start_times = context.connection.info.get('query_start_time')
+            if start_times:
+                start_times.pop()
+
+
+# Хэндлер, отдающий метрики в формате Prometheus
+async def metrics_handler(request: web.Request) -> web.Response:
+    response = web.Response(body=generate_latest())
+    response.content_type = CONTENT_TYPE_LATEST.split(';')[0]
+    response.charset = 'utf-8'
+    return response
+
+
+# Функция, запускающая HTTP-сервер с метриками
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get('/metrics', metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    return runner
@@ -0,0 +1,25 @@
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from config_data.logging_config import (chat_id_var, update_id_var,
+                                        user_id_var)
+
+
+# Middleware, которое сохраняет id апдейта, чата и пользователя
+# в контекст, чтобы они попадали во все записи лога
+class LogContextMiddleware(BaseMiddleware):
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, dict[str, Any]],
+                              Awaitable[Any]],
+            event: Update,
+            data: dict[str, Any]
+    ) -> Any:
+        chat = data.get('event_chat')
+        user = data.get('event_from_user')
+        update_id_var.set(event.update_id)
+        chat_id_var.set(chat.id if chat else None)
+        user_id_var.set(user.id if user else None)
+        return await handler(event, data)
@@ -0,0 +1,49 @@
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from metrics.metrics import HANDLER_DURATION, UPDATE_DURATION, UPDATES_TOTAL
+
+
+# Middleware для диспетчера, которое считает апдейты по типу и состоянию
+# пользователя и замеряет время их обработки
+class UpdateMetricsMiddleware(BaseMiddleware):
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, dict[str, Any]],
+                              Awaitable[Any]],
+            event: Update,
+            data: dict[str, Any]
+    ) -> Any:
+        update_type = event.event_type
+        UPDATES_TOTAL.labels(update_type,
+                             data.get('raw_state') or 'default').inc()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            UPDATE_DURATION.labels(update_type).observe(
+                time.perf_counter() - started)
+
+
+# Middleware для хэндлеров, которое замеряет время работы
+# каждого хэндлера отдельно
+class HandlerMetricsMiddleware(BaseMiddleware):
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, dict[str, Any]],
+                              Awaitable[Any]],
+            event: TelegramObject,
+            data: dict[str, Any]
+    ) -> Any:
+        handler_object = data.get('handler')
+        name = (handler_object.callback.__qualname__
+                if handler_object else 'unknown')
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            HANDLER_DURATION.labels(name).observe(
+                time.perf_counter() - started)
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import TelegramObject, Update
+
+from metrics.metrics import UPDATES_DROPPED
+
+logger = logging.getLogger(__name__)
+
+# Ответ на сообщение или нажатие кнопки, апдейт которого был отброшен
+DROPPED_UPDATE_TEXT = 'Бот перегружен, попробуйте еще раз'
+
+UpdateHandler = Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]]
+
+
+# Middleware, которое ограничивает нагрузку на бота. Регистрируется
+# до FSM-middleware и считает все принятые апдейты, включая те, что
+# ждут своей очереди в чате. Если в очереди уже max_pending апдейтов,
+# новые апдейты отбрасываются. Отброшенный апдейт потерян безвозвратно:
+# и getUpdates, и ответ на запрос вебхука подтверждают его получение,
+# поэтому Telegram не присылает его повторно. Чтобы пользователь знал,
+# что его действие не выполнено, на сообщения и нажатия кнопок бот
+# отвечает, что перегружен, остальные апдейты только попадают в лог
+# и метрику bot_updates_dropped_total.
+# Очередность апдейтов одного чата обеспечивает изоляция событий
+# диспетчера, а limit ограничивает количество одновременно
+# обрабатываемых апдейтов до max_concurrency
+class UpdateSchedulerMiddleware(BaseMiddleware):
+    def __init__(self, max_concurrency: int, max_pending: int):
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._max_pending = max_pending
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def __call__(
+            self,
+            handler: UpdateHandler,
+            event: Update,
+            data: dict[str, Any]
+    ) -> Any:
+        if self._pending >= self._max_pending:
+            await self._drop(event)
+            return None
+
+        self._pending += 1
+        try:
+            return await handler(event, data)
+        finally:
+            self._pending -= 1
+
+    # Middleware, которое регистрируется после FSM-middleware: общий слот
+    # занимается только тогда, когда подошла очередь апдейта в чате
+    async def limit(
+            self,
+            handler: UpdateHandler,
+            event: Update,
+            data: dict[str, Any]
+    ) -> Any:
+        async with self._slots:
+            return await handler(event, data)
+
+    async def _drop(self, event: Update) -> None:
+        logger.warning('Update queue is full (%d), dropping update %d',
+                       self._pending, event.update_id)
+        UPDATES_DROPPED.labels(event.event_type).inc()
+        try:
+            if event.callback_query is not None:
+                await event.callback_query.answer(text=DROPPED_UPDATE_TEXT)
+            elif event.message is not None:
+                await event.message.answer(text=DROPPED_UPDATE_TEXT)
+        except TelegramAPIError as e:
+            logger.warning('Failed to answer dropped update %d: %s',
+                           event.update_id, e)
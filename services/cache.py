@@ -0,0 +1,100 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+
+# Класс для кэша с ограниченным размером (LRU) и временем жизни записей (TTL)
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        # Запросы, которые выполняются в данный момент
+        self._in_flight: dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    # Функция, возвращающая значение из кэша или default,
+    # если записи нет или она устарела
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    # Функция, добавляющая значение в кэш и вытесняющая
+    # самые давно использованные записи
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    # Функция, удаляющая запись из кэша
+    def invalidate(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    # Функция, возвращающая значение из кэша или загружающая его.
+    # Одновременные запросы по одному ключу выполняют загрузку один раз
+    async def get_or_load(self, key: Hashable,
+                          loader: Callable[[], Awaitable[Any]]) -> Any:
+        sentinel = object()
+        while True:
+            value = self.get(key, sentinel)
+            if value is not sentinel:
+                return value
+
+            future = self._in_flight.get(key)
+            if future is None:
+                break
+            # asyncio.wait не отменяет загрузку при отмене ожидающего
+            # и не пробрасывает ему отмену самой загрузки
+            await asyncio.wait({future})
+            if not future.cancelled():
+                return future.result()
+            # Загрузку отменили вместе с запросом, который ее начал,
+            # поэтому ожидающий запрос выполняет ее заново
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Помечаем исключение как полученное, если ожидающих нет
+            future.exception()
+            raise
+        else:
+            # None означает неудачную загрузку, такие результаты не кэшируем
+            if value is not None:
+                self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            self._in_flight.pop(key, None)
+
+    # Функция, возвращающая статистику кэша
+    def stats(self) -> dict[str, float]:
+        total = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._data),
+                'hit_ratio': self.hits / total if total else 0.0}
@@ -1,32 +1,208 @@
-import wikipedia
-import difflib
+import asyncio
+import logging
+import re
+from urllib.parse import quote, unquote, urlsplit
 
-from services.link_service import shorten_url
+import aiohttp
 
+from database.orm import FilmORM
+from metrics.metrics import EXTERNAL_CALL_DURATION, register_cache
+from services.cache import TTLCache
+from services.http_client import HttpClient
+from services.similarity import TitleMatcher
 
-def search_films(query: str, max_results: int = 10) -> dict[str, str] | None:
-    wikipedia.set_lang('ru')
+logger = logging.getLogger(__name__)
 
-    # Используем функцию wikipedia.search для поиска страниц по запросу
-    search_results = wikipedia.search(query, results=max_results)
+WIKI_API_URL = 'https://ru.wikipedia.org/w/api.php'
+# Начало ссылок на страницы Википедии в каталоге фильмов
+WIKI_PAGE_URL = 'https://ru.wikipedia.org/wiki/'
+# Символы, которые Википедия не кодирует в ссылках на страницы
+WIKI_URL_SAFE_CHARS = ';@$!*(),/~:'
+# Таймауты для отдельных запросов к Википедии
+SEARCH_TIMEOUT = aiohttp.ClientTimeout(total=3)
+PAGE_TIMEOUT = aiohttp.ClientTimeout(total=3)
+# Максимальное количество названий в одном запросе к API Википедии
+MAX_TITLES_PER_QUERY = 50
+# Размер и время жизни общего для всех пользователей кэша результатов поиска
+SEARCH_CACHE_SIZE = 2048
+SEARCH_CACHE_TTL = 6 * 60 * 60
+
+# Минимальная схожесть названия из результатов поиска с запросом.
+# Коэффициент Дайса по триграммам строже ratio() из difflib. С порогом
+# 0.78 отбираются почти те же названия, что и с прежним порогом 0.9
+# для difflib (benchmarks/bench_title_matching.py)
+SIMILARITY_THRESHOLD = 0.78
+# Минимальная схожесть названия из локального каталога с запросом,
+# при которой поиск в Википедии не выполняется. Название сравнивается
+# без уточнения в скобках, например "Интерстеллар" вместо
+# "Интерстеллар (фильм)"
+LOCAL_MATCH_SIMILARITY = 0.9
+# Уточнение в скобках в конце названия страницы Википедии
+TITLE_SUFFIX_PATTERN = re.compile(r'\s*\([^()]*\)\s*$')
+
+search_cache = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+register_cache('film_search', search_cache)
+
+
+# Функция, выполняющая запрос к API Википедии
+async def _wiki_query(operation: str, params: dict,
+                      timeout: aiohttp.ClientTimeout) -> dict | None:
+    session = HttpClient.get_session()
+    params = {'action': 'query', 'format': 'json', **params}
+    try:
+        with EXTERNAL_CALL_DURATION.labels('wikipedia', operation).time():
+            async with session.get(WIKI_API_URL, params=params,
+                                   timeout=timeout) as response:
+                response.raise_for_status()
+                return await response.json()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.warning('Wikipedia request failed: %r', e)
+        return None
+
+
+# Функция, возвращающая названия страниц по поисковому запросу
+# или None, если запрос к Википедии не удался
+async def _search_titles(query: str, max_results: int) -> list[str] | None:
+    data = await _wiki_query(
+        'search',
+        {'list': 'search', 'srsearch': query,
+         'srlimit': max_results, 'srprop': ''},
+        SEARCH_TIMEOUT)
+    if not data:
+        return None
+    return [item['title'] for item in data['query']['search']]
+
+
+# Функция, возвращающая каноничные названия страниц и ссылки на них
+# одним запросом к API Википедии с учетом перенаправлений.
+# Если хотя бы один запрос не удался, возвращает None, чтобы неполный
+# результат не попал в кэш
+async def _get_pages(
+        titles: list[str]) -> dict[str, tuple[str, str]] | None:
+    pages: dict[str, tuple[str, str]] = {}
+    for start in range(0, len(titles), MAX_TITLES_PER_QUERY):
+        batch = titles[start:start + MAX_TITLES_PER_QUERY]
+        data = await _wiki_query(
+            'pages',
+            {'prop': 'info', 'inprop': 'url',
+             'titles': '|'.join(batch), 'redirects': 1},
+            PAGE_TIMEOUT)
+        if not data:
+            return None
+        query = data['query']
+        # Связки "исходное название - название после нормализации
+        # или перенаправления"
+        aliases = {item['from']: item['to']
+                   for key in ('normalized', 'redirects')
+                   for item in query.get(key, [])}
+        found = {page['title']: (page['title'], page['fullurl'])
+                 for page in query['pages'].values()
+                 if 'missing' not in page and 'invalid' not in page}
+        for title in batch:
+            canonical = title
+            seen = set()
+            while canonical not in found and canonical in aliases \
+                    and canonical not in seen:
+                seen.add(canonical)
+                canonical = aliases[canonical]
+            if canonical in found:
+                pages[title] = found[canonical]
+    return pages
+
+
+# Функция, приводящая ссылку на страницу Википедии к виду, в котором
+# ее возвращает API. Для остальных ссылок возвращает None
+def canonical_wiki_link(url: str) -> str | None:
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return None
+    if (parts.scheme not in ('http', 'https')
+            or parts.netloc.lower() != 'ru.wikipedia.org'
+            or not parts.path.startswith('/wiki/') or parts.query):
+        return None
+    title = unquote(parts.path[len('/wiki/'):]).strip().replace(' ', '_')
+    if not title or any(char.isspace() for char in title):
+        return None
+    return WIKI_PAGE_URL + quote(title, safe=WIKI_URL_SAFE_CHARS)
+
+
+# Функция, приводящая поисковый запрос к ключу кэша
+def _normalize_query(query: str) -> str:
+    return ' '.join(query.casefold().split())
+
+
+# Функция поиска фильмов, которая сначала обращается к общему кэшу.
+# Одинаковые одновременные запросы выполняют поиск в Википедии один раз
+async def search_films(query: str,
+                       max_results: int = 10) -> dict[str, str] | None:
+    key = (_normalize_query(query), max_results)
+    return await search_cache.get_or_load(
+        key, lambda: _search_films(query, max_results))
+
+
+# Функция, убирающая из названия страницы уточнение в скобках
+def _strip_title_suffix(title: str) -> str:
+    return TITLE_SUFFIX_PATTERN.sub('', title) or title
+
+
+# Функция, ищущая фильмы в локальном каталоге. Возвращает только фильмы
+# со ссылкой на страницу Википедии, название которых точно или очень
+# близко совпадает с запросом
+async def _search_local_films(query: str,
+                              max_results: int) -> dict[str, str] | None:
+    films = [(title, wiki_link)
+             for title, wiki_link, _ in await FilmORM.search_films(
+                 query, limit=max_results)
+             if canonical_wiki_link(wiki_link) == wiki_link]
+    if not films:
+        return None
+    matcher = TitleMatcher([_strip_title_suffix(title) for title, _ in films])
+    suggestions = dict(films[index] for index, _ in matcher.top(
+        query, max_results, min_score=LOCAL_MATCH_SIMILARITY))
+    return suggestions or None
+
+
+async def _search_films(query: str,
+                        max_results: int) -> dict[str, str] | None:
+    # Сначала ищем в локальном каталоге
+    local_suggestions = await _search_local_films(query, max_results)
+    if local_suggestions:
+        return local_suggestions
+
+    # Ищем страницы по запросу в Википедии
+    search_results = await _search_titles(query, max_results)
 
     # Создаем словарь для хранения результатов поиска
     suggestions: dict[str, str] = {}
 
-    # Перебираем результаты поиска и получаем ссылки на страницы Википедии
+    # Отбираем подходящие результаты поиска
     if search_results:
-        for title in search_results:
-            if query.lower() == title.lower():
-                page = wikipedia.page(title)
-                suggestions[page.title] = shorten_url(page.url)
-            # Если нет полного соответствия, проверяем
-            # на схожесть с помощью difflib
-            elif difflib.SequenceMatcher(
-                    None, query.lower(), title.lower()).ratio() > 0.9:
-                page = wikipedia.page(title)
-                suggestions[page.title] = shorten_url(page.url)
+        query_lower = query.lower()
+        # Индекс строится один раз для результатов поиска, похожие
+        # названия отбираются за один проход
+        similar = {index for index, _ in TitleMatcher(search_results).top(
+            query, max_results, min_score=SIMILARITY_THRESHOLD)}
+        matched_titles: list[str] = []
+        for index, title in enumerate(search_results):
+            if query_lower == title.lower():
+                matched_titles.append(title)
+            # Если нет полного соответствия, проверяем на схожесть
+            elif index in similar:
+                matched_titles.append(title)
             elif query in title and '(фильм,' in title:
-                page = wikipedia.page(title)
-                suggestions[page.title] = shorten_url(page.url)
+                matched_titles.append(title)
+
+        # Получаем ссылки на все подходящие страницы одним запросом
+        pages = await _get_pages(matched_titles)
+        if pages is None:
+            return None
+        # В предложения попадают полные ссылки: они же сохраняются
+        # в каталоге фильмов, а сокращаются только при отправке кнопок
+        for title in matched_titles:
+            if title in pages:
+                page_title, page_url = pages[title]
+                suggestions.setdefault(
+                    page_title, canonical_wiki_link(page_url) or page_url)
 
         return suggestions
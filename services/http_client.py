@@ -0,0 +1,33 @@
+import aiohttp
+
+# Ограничения пула соединений, общего для всех внешних сервисов
+POOL_LIMIT = 100
+POOL_LIMIT_PER_HOST = 20
+# Таймаут по умолчанию для запросов к внешним сервисам
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=10, connect=3)
+
+
+# Класс для работы с общим HTTP-клиентом
+class HttpClient:
+    _session: aiohttp.ClientSession | None = None
+
+    # Функция, возвращающая общую сессию с пулом соединений
+    @classmethod
+    def get_session(cls) -> aiohttp.ClientSession:
+        if cls._session is None or cls._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=POOL_LIMIT,
+                limit_per_host=POOL_LIMIT_PER_HOST,
+                ttl_dns_cache=300)
+            cls._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=DEFAULT_TIMEOUT,
+                headers={'User-Agent': 'rate_films_bot/1.0'})
+        return cls._session
+
+    # Функция, закрывающая сессию при остановке бота
+    @classmethod
+    async def close(cls) -> None:
+        if cls._session is not None and not cls._session.closed:
+            await cls._session.close()
+        cls._session = None
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from database.orm import FilmStatsORM
+
+logger = logging.getLogger(__name__)
+
+# Окно "за все время"
+ALL_TIME = 0
+
+ChartRow = tuple[int, str, float, int]
+
+
+# Готовые списки фильмов для одного окна
+@dataclass(frozen=True)
+class Charts:
+    top_rated: tuple[ChartRow, ...]
+    most_rated: tuple[ChartRow, ...]
+    updated_at: datetime
+
+
+# Класс для списков /top. Списки пересчитываются фоновой задачей из
+# статистики фильмов и хранятся в памяти, поэтому запросы пользователей
+# не обращаются к базе данных, сколько бы их ни было.
+# Инкрементально обновляется статистика в film_stats и film_daily_stats
+# (триггером на каждую оценку). Списки при каждом обновлении читаются
+# из нее заново: это индексные запросы первых size строк, и их стоимость
+# не зависит от количества оценок
+class Leaderboards:
+    def __init__(self, windows: list[int], size: int,
+                 min_ratings: int, refresh_interval: float):
+        # Повторяющиеся окна убираем, порядок сохраняем
+        self.windows = tuple(dict.fromkeys(windows)) or (ALL_TIME,)
+        self.size = size
+        self.min_ratings = min_ratings
+        self.refresh_interval = refresh_interval
+        self._charts: dict[int, Charts] = {}
+        self._task: asyncio.Task | None = None
+
+    def get(self, window: int) -> Charts | None:
+        return self._charts.get(window)
+
+    async def _build(self, window: int) -> Charts:
+        if window == ALL_TIME:
+            top_rated = await FilmStatsORM.get_top_rated(self.size,
+                                                         self.min_ratings)
+            most_rated = await FilmStatsORM.get_most_rated(self.size)
+        else:
+            top_rated, most_rated = await FilmStatsORM.get_window_charts(
+                window, self.size, self.min_ratings)
+        return Charts(tuple(top_rated), tuple(most_rated),
+                      datetime.now(timezone.utc))
+
+    # Функция, пересчитывающая все списки. Новые списки подменяют старые
+    # целиком, поэтому пользователи не видят частично обновленных данных
+    async def refresh(self) -> None:
+        self._charts = {window: await self._build(window)
+                        for window in self.windows}
+
+    async def _safe_refresh(self) -> None:
+        try:
+            await self.refresh()
+        except Exception:
+            logger.exception('Failed to refresh leaderboards')
+
+    async def _run(self) -> None:
+        while True:
+            await self._safe_refresh()
+            await asyncio.sleep(self.refresh_interval)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
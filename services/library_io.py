@@ -0,0 +1,250 @@
+import codecs
+import csv
+import io
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, AsyncIterable, AsyncIterator
+
+from aiogram import Bot
+from aiogram.types import InputFile
+
+from database.orm import FilmORM, LibraryORM, RatingORM, ReviewORM
+from services.film_service import canonical_wiki_link
+
+logger = logging.getLogger(__name__)
+
+# Поддерживаемые форматы файлов
+LIBRARY_FORMATS = ('csv', 'jsonl')
+# Колонки файла в порядке записи
+LIBRARY_FIELDS = ('title', 'wiki_link', 'rating', 'review')
+# Количество строк файла, которые записываются в базу данных за раз
+IMPORT_BATCH_SIZE = 1000
+# Размер порции данных при выгрузке
+EXPORT_CHUNK_SIZE = 64 * 1024
+# Сколько ошибок в строках запоминается для отчета пользователю
+MAX_REPORTED_ERRORS = 10
+
+LibraryRow = tuple[str, str, int | None, str | None]
+
+
+# Ошибка в содержимом загружаемого файла
+class LibraryFormatError(ValueError):
+    pass
+
+
+# Итоги загрузки библиотеки
+@dataclass
+class ImportResult:
+    ratings: int = 0
+    reviews: int = 0
+    skipped: int = 0
+    errors: list[str] = field(default_factory=list)
+
+    def add_error(self, line_no: int, error: str) -> None:
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f'строка {line_no}: {error}')
+
+
+# Функция, возвращающая формат файла по его имени
+def detect_format(filename: str | None) -> str | None:
+    if not filename or '.' not in filename:
+        return None
+    extension = filename.rsplit('.', 1)[1].lower()
+    if extension == 'json':
+        extension = 'jsonl'
+    return extension if extension in LIBRARY_FORMATS else None
+
+
+# Функция, превращающая поток байтов в поток строк. Строки собираются
+# из частей по мере поступления, поэтому файл целиком в памяти не хранится
+async def _iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    tail = ''
+    async for chunk in chunks:
+        lines = (tail + decoder.decode(chunk)).split('\n')
+        tail = lines.pop()
+        for line in lines:
+            yield line
+    tail += decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+# Функция, превращающая поток строк CSV в поток записей. Запись
+# продолжается на следующей строке, пока в ней нечетное число кавычек
+async def _iter_csv_records(
+        lines: AsyncIterable[str]) -> AsyncIterator[tuple[int, list[str]]]:
+    record: list[str] = []
+    quotes = 0
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        record.append(line)
+        quotes += line.count('"')
+        if quotes % 2:
+            continue
+        text = '\n'.join(record)
+        record, quotes = [], 0
+        if text.strip():
+            yield line_no, next(csv.reader([text]))
+    if record:
+        raise LibraryFormatError(f'строка {line_no}: незакрытая кавычка')
+
+
+# Функция, проверяющая значения одной строки файла
+def _parse_row(title, wiki_link, rating, review) -> LibraryRow:
+    title = str(title or '').strip()
+    wiki_link = str(wiki_link or '').strip()
+    if not title or not wiki_link:
+        raise ValueError('нет названия или ссылки')
+    # Фильмы из файла попадают в общий каталог, поэтому принимаются
+    # только ссылки на страницы Википедии
+    canonical_link = canonical_wiki_link(wiki_link)
+    if canonical_link is None:
+        raise ValueError('ссылка не ведет на страницу ru.wikipedia.org')
+    wiki_link = canonical_link
+    if rating in (None, ''):
+        rating = None
+    else:
+        try:
+            rating = int(rating)
+        except (TypeError, ValueError):
+            raise ValueError(f'некорректная оценка {rating!r}')
+        if not 0 <= rating <= 10:
+            raise ValueError(f'оценка {rating} вне диапазона 0-10')
+    review = str(review).strip() if review is not None else ''
+    if rating is None and not review:
+        raise ValueError('нет ни оценки, ни рецензии')
+    return title, wiki_link, rating, review or None
+
+
+# Функция, возвращающая проверенные строки CSV-файла
+async def _read_csv(chunks: AsyncIterable[bytes],
+                    result: ImportResult) -> AsyncIterator[LibraryRow]:
+    columns = None
+    async for line_no, values in _iter_csv_records(_iter_lines(chunks)):
+        if columns is None:
+            columns = [value.strip().lower() for value in values]
+            if not {'title', 'wiki_link'} <= set(columns):
+                raise LibraryFormatError(
+                    'в заголовке нет колонок title и wiki_link')
+            continue
+        row = dict(zip(columns, values))
+        try:
+            yield _parse_row(*(row.get(name) for name in LIBRARY_FIELDS))
+        except ValueError as e:
+            result.add_error(line_no, str(e))
+
+
+# Функция, возвращающая проверенные строки JSONL-файла
+async def _read_jsonl(chunks: AsyncIterable[bytes],
+                      result: ImportResult) -> AsyncIterator[LibraryRow]:
+    line_no = 0
+    async for line in _iter_lines(chunks):
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError('строка не является объектом')
+            yield _parse_row(*(row.get(name) for name in LIBRARY_FIELDS))
+        except ValueError as e:
+            result.add_error(line_no, str(e))
+
+
+# Функция, записывающая пачку строк в базу данных: фильмы добавляются
+# одним запросом, оценки и рецензии передаются через COPY
+async def _write_batch(user_id: int, batch: list[LibraryRow],
+                       result: ImportResult) -> None:
+    film_ids = await FilmORM.get_or_create_films(
+        [(title, wiki_link) for title, wiki_link, _, _ in batch])
+    ratings = [(user_id, film_ids[wiki_link], rating)
+               for _, wiki_link, rating, _ in batch if rating is not None]
+    reviews = [(user_id, film_ids[wiki_link], review)
+               for _, wiki_link, _, review in batch if review is not None]
+    if ratings:
+        await RatingORM.copy_ratings(ratings)
+        # Повторы фильма в пачке сохраняются одной оценкой
+        result.ratings += len({film_id for _, film_id, _ in ratings})
+    if reviews:
+        await ReviewORM.copy_reviews(reviews)
+        result.reviews += len(reviews)
+
+
+# Функция, загружающая библиотеку пользователя из потока байтов.
+# Файл читается по частям, в памяти хранится не больше одной пачки строк
+async def import_library(user_id: int,
+                         chunks: AsyncIterable[bytes],
+                         fmt: str,
+                         batch_size: int = IMPORT_BATCH_SIZE) -> ImportResult:
+    if fmt not in LIBRARY_FORMATS:
+        raise LibraryFormatError(f'неизвестный формат {fmt!r}')
+    result = ImportResult()
+    reader = _read_csv if fmt == 'csv' else _read_jsonl
+    batch: list[LibraryRow] = []
+    async for row in reader(chunks, result):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            await _write_batch(user_id, batch, result)
+            batch = []
+    if batch:
+        await _write_batch(user_id, batch, result)
+    logger.info('Imported library for user %d: %d ratings, %d reviews, '
+                '%d skipped', user_id, result.ratings, result.reviews,
+                result.skipped)
+    return result
+
+
+# Функция, кодирующая строки библиотеки в CSV
+def _encode_csv(rows: list[LibraryRow], header: bool) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    if header:
+        writer.writerow(LIBRARY_FIELDS)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+# Функция, кодирующая строки библиотеки в JSONL
+def _encode_jsonl(rows: list[LibraryRow], header: bool) -> str:
+    return ''.join(
+        json.dumps(dict(zip(LIBRARY_FIELDS, row)), ensure_ascii=False) + '\n'
+        for row in rows)
+
+
+# Функция, выгружающая библиотеку пользователя порциями байтов.
+# Строки читаются из базы через серверный курсор и сразу кодируются,
+# поэтому потребление памяти не зависит от размера библиотеки
+async def export_library(user_id: int, fmt: str,
+                         chunk_size: int = EXPORT_CHUNK_SIZE
+                         ) -> AsyncIterator[bytes]:
+    if fmt not in LIBRARY_FORMATS:
+        raise LibraryFormatError(f'неизвестный формат {fmt!r}')
+    encode = _encode_csv if fmt == 'csv' else _encode_jsonl
+    rows: list[LibraryRow] = []
+    size = 0
+    header = True
+    async for row in LibraryORM.stream_user_library(user_id):
+        rows.append(row)
+        size += len(row[0]) + len(row[1]) + len(row[3] or '')
+        if size >= chunk_size:
+            yield encode(rows, header).encode('utf-8')
+            rows, size, header = [], 0, False
+    if rows or header:
+        yield encode(rows, header).encode('utf-8')
+
+
+# Файл для отправки в Telegram, содержимое которого формируется во время
+# отправки. Выгрузка передается в запрос по частям, не собираясь в памяти
+class LibraryExportFile(InputFile):
+    def __init__(self, user_id: int, fmt: str, filename: str | None = None):
+        super().__init__(filename=filename or f'films.{fmt}')
+        self.user_id = user_id
+        self.fmt = fmt
+
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:
+        async for chunk in export_library(self.user_id, self.fmt):
+            yield chunk
@@ -1,12 +1,83 @@
-import requests
+import asyncio
+import logging
 
+import aiohttp
 
-def shorten_url(long_url: str) -> str:
+from database.orm import ShortLinkORM
+from metrics.metrics import EXTERNAL_CALL_DURATION, register_cache
+from services.cache import TTLCache
+from services.http_client import HttpClient
+
+logger = logging.getLogger(__name__)
+
+TINYURL_API_URL = 'https://tinyurl.com/api-create.php'
+# Строгий таймаут для запроса к сервису сокращения ссылок
+SHORTEN_TIMEOUT = aiohttp.ClientTimeout(total=2)
+# Ссылки не длиннее этого значения не сокращаем
+MAX_URL_LENGTH = 50
+# Кэш связок "длинная ссылка - короткая ссылка"
+LINK_CACHE_SIZE = 4096
+LINK_CACHE_TTL = 24 * 60 * 60
+
+link_cache = TTLCache(maxsize=LINK_CACHE_SIZE, ttl=LINK_CACHE_TTL)
+register_cache('short_links', link_cache)
+
+
+# Функция, сокращающая ссылку с помощью tinyurl
+async def _request_short_url(long_url: str) -> str | None:
+    session = HttpClient.get_session()
     try:
-        response = requests.get(
-            f'http://tinyurl.com/api-create.php?url={long_url}')
-        if response.status_code == 200:
-            return response.text
-    except Exception as e:
-        print(f"Error occurred while shortening URL: {e}")
-    return long_url  # Возвращаем исходную URL в случае ошибки
+        with EXTERNAL_CALL_DURATION.labels('tinyurl', 'shorten').time():
+            async with session.get(TINYURL_API_URL,
+                                   params={'url': long_url},
+                                   timeout=SHORTEN_TIMEOUT) as response:
+                if response.status == 200:
+                    return (await response.text()).strip()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.warning('Error occurred while shortening URL: %r', e)
+    return None
+
+
+# Функция, возвращающая короткие ссылки для списка ссылок.
+# Каждая ссылка сокращается не более одного раза: результаты хранятся
+# в кэше и в базе данных
+async def shorten_urls(long_urls: list[str]) -> dict[str, str]:
+    result: dict[str, str] = {}
+    missing: list[str] = []
+    for long_url in dict.fromkeys(long_urls):
+        if len(long_url) <= MAX_URL_LENGTH:
+            result[long_url] = long_url
+            continue
+        short_url = link_cache.get(long_url)
+        if short_url:
+            result[long_url] = short_url
+        else:
+            missing.append(long_url)
+
+    if missing:
+        # Ищем ранее сокращенные ссылки в базе данных
+        stored = await ShortLinkORM.get_short_urls(missing)
+        for long_url, short_url in stored.items():
+            link_cache.set(long_url, short_url)
+        result.update(stored)
+        missing = [long_url for long_url in missing if long_url not in stored]
+
+    if missing:
+        # Сокращаем оставшиеся ссылки параллельно
+        short_urls = await asyncio.gather(
+            *(_request_short_url(long_url) for long_url in missing))
+        new_links = {long_url: short_url
+                     for long_url, short_url in zip(missing, short_urls)
+                     if short_url}
+        if new_links:
+            await ShortLinkORM.set_short_urls(new_links)
+            for long_url, short_url in new_links.items():
+                link_cache.set(long_url, short_url)
+        result.update(new_links)
+
+    # Возвращаем исходную ссылку, если сократить ее не удалось
+    return {long_url: result.get(long_url, long_url) for long_url in long_urls}
+
+
+async def shorten_url(long_url: str) -> str:
+    return (await shorten_urls([long_url]))[long_url]
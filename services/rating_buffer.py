@@ -0,0 +1,141 @@
+import asyncio
+import logging
+
+from sqlalchemy.exc import IntegrityError
+
+from database.orm import RatingORM
+
+logger = logging.getLogger(__name__)
+
+# Интервал, с которым накопленные оценки записываются в базу данных
+FLUSH_INTERVAL = 2.0
+# Количество оценок в буфере, при котором запись начинается сразу
+MAX_BUFFER_SIZE = 500
+# Максимум оценок в буфере. Если запись не успевает за новыми оценками
+# или база данных недоступна, новая оценка ждет записи буфера
+MAX_PENDING_RATINGS = 10 * MAX_BUFFER_SIZE
+
+
+# Класс для отложенной записи оценок. Оценки одного пользователя
+# для одного фильма объединяются, в базу попадает только последняя.
+# Накопленные оценки записываются одним запросом по таймеру,
+# по заполнению буфера и при остановке бота. При подтверждении оценки
+# записываются только оценки этого пользователя.
+# Буфер хранится в памяти процесса. Если апдейты одного пользователя
+# обрабатывают несколько реплик бота (режим вебхука за балансировщиком),
+# подтверждение и /export записывают только оценки из буфера своей
+# реплики, а оценки из других реплик попадают в базу с задержкой
+# до FLUSH_INTERVAL. Такое отставание допустимо для отложенной записи;
+# если оно недопустимо, бот нужно запускать одним процессом
+class RatingWriteBuffer:
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL,
+                 max_size: int = MAX_BUFFER_SIZE,
+                 max_pending: int = MAX_PENDING_RATINGS):
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.max_pending = max_pending
+        self._pending: dict[tuple[int, int], int] = {}
+        # Записи выполняются по очереди, чтобы более старая оценка
+        # не перезаписала более новую
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        # Запись по заполнению буфера. Пока она не завершилась,
+        # новая не запускается
+        self._size_flush: asyncio.Task | None = None
+
+    async def add(self, user_id: int | None, film_id: int,
+                  rating: int) -> None:
+        if user_id is None:
+            logger.warning('Rating for film %d without user is skipped',
+                           film_id)
+            return
+        key = (user_id, film_id)
+        if key not in self._pending and len(self._pending) >= self.max_pending:
+            # Буфер переполнен: оценка ждет, пока накопленные оценки
+            # будут записаны
+            await self.flush()
+        self._pending[key] = rating
+        if (len(self._pending) >= self.max_size
+                and (self._size_flush is None or self._size_flush.done())):
+            self._size_flush = asyncio.create_task(self._safe_flush())
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            await self._write_batch(batch)
+
+    # Функция, записывающая накопленные оценки одного пользователя.
+    # Оценки остальных пользователей остаются в буфере до общей записи
+    async def flush_user(self, user_id: int | None) -> None:
+        if user_id is None:
+            return
+        async with self._flush_lock:
+            batch = {key: self._pending.pop(key)
+                     for key in list(self._pending) if key[0] == user_id}
+            if batch:
+                await self._write_batch(batch)
+
+    async def _write_batch(self, batch: dict[tuple[int, int], int]) -> None:
+        rows = [(user_id, film_id, rating)
+                for (user_id, film_id), rating in batch.items()]
+        try:
+            await RatingORM.set_ratings(rows)
+        except IntegrityError:
+            # Одна некорректная оценка, например для удаленного фильма,
+            # не должна мешать записи остальных
+            logger.warning('Failed to write %d ratings in one batch, '
+                           'writing them one by one', len(rows))
+            await self._write_rows(rows)
+        except Exception:
+            self._restore(rows)
+            raise
+
+    # Функция, записывающая оценки по одной. Оценки, которые база
+    # данных не принимает, отбрасываются
+    async def _write_rows(self, rows: list[tuple[int, int, int]]) -> None:
+        for position, (user_id, film_id, rating) in enumerate(rows):
+            try:
+                await RatingORM.set_or_update_rating(user_id, film_id, rating)
+            except IntegrityError as e:
+                logger.error('Dropping rating %d of user %d for film %d: %s',
+                             rating, user_id, film_id, e.orig)
+            except Exception:
+                self._restore(rows[position:])
+                raise
+
+    # Функция, возвращающая оценки в буфер, не затирая более новые
+    def _restore(self, rows: list[tuple[int, int, int]]) -> None:
+        for user_id, film_id, rating in rows:
+            self._pending.setdefault((user_id, film_id), rating)
+
+    async def _safe_flush(self) -> None:
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception('Failed to flush ratings')
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._safe_flush()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    # Функция, останавливающая запись по таймеру
+    # и записывающая оставшиеся оценки
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+rating_buffer = RatingWriteBuffer()
@@ -0,0 +1,69 @@
+import numpy as np
+
+# Длина n-грамм, по которым сравниваются названия
+NGRAM_SIZE = 3
+
+
+# Функция, возвращающая множество n-грамм названия
+def _ngrams(text: str) -> set[str]:
+    padded = f'{" " * (NGRAM_SIZE - 1)}{" ".join(text.casefold().split())} '
+    return {padded[i:i + NGRAM_SIZE]
+            for i in range(len(padded) - NGRAM_SIZE + 1)}
+
+
+# Класс для ранжирования названий по схожести с запросом.
+# Индекс n-грамм строится один раз для списка названий, после чего
+# любое количество запросов сравнивается со всеми названиями за один
+# векторизованный проход. Индекс хранится как разреженная матрица
+# "n-грамма - название" в формате CSC: отсортированный словарь n-грамм,
+# смещения и номера названий. Схожесть считается коэффициентом Дайса
+# по множествам n-грамм
+class TitleMatcher:
+    def __init__(self, titles: list[str]):
+        self.titles = list(titles)
+        title_ngrams = [_ngrams(title) for title in self.titles]
+        self._sizes = np.fromiter((len(ngrams) for ngrams in title_ngrams),
+                                  dtype=np.int64, count=len(title_ngrams))
+        flat = np.array([ngram for ngrams in title_ngrams
+                         for ngram in ngrams], dtype=f'<U{NGRAM_SIZE}')
+        # Отсортированный словарь n-грамм и номер n-граммы
+        # для каждой пары "n-грамма - название"
+        self._vocabulary, ngram_ids = np.unique(flat, return_inverse=True)
+        title_ids = np.repeat(np.arange(len(self.titles), dtype=np.int32),
+                              self._sizes)
+        order = np.argsort(ngram_ids, kind='stable')
+        self._postings = title_ids[order]
+        self._offsets = np.concatenate(([0], np.cumsum(np.bincount(
+            ngram_ids, minlength=len(self._vocabulary)))))
+
+    # Функция, возвращающая схожесть запроса со всеми названиями
+    def scores(self, query: str) -> np.ndarray:
+        query_ngrams = np.array(sorted(_ngrams(query)),
+                                dtype=f'<U{NGRAM_SIZE}')
+        if not len(self._vocabulary) or not len(query_ngrams):
+            return np.zeros(len(self.titles), dtype=np.float32)
+        positions = np.searchsorted(self._vocabulary, query_ngrams)
+        positions = positions[positions < len(self._vocabulary)]
+        ngram_ids = positions[
+            self._vocabulary[positions] == query_ngrams[:len(positions)]]
+        hits = np.concatenate([
+            self._postings[self._offsets[i]:self._offsets[i + 1]]
+            for i in ngram_ids] or [np.empty(0, dtype=np.int32)])
+        shared = np.bincount(hits, minlength=len(self.titles))
+        return (2 * shared / (self._sizes + len(query_ngrams))).astype(
+            np.float32)
+
+    # Функция, возвращающая номера и схожесть до top_k самых похожих
+    # названий со схожестью не ниже min_score в порядке убывания схожести.
+    # Возвращаются номера, потому что названия в списке могут повторяться
+    def top(self, query: str, top_k: int = 10,
+            min_score: float = 0.0) -> list[tuple[int, float]]:
+        scores = self.scores(query)
+        top_k = min(top_k, len(scores))
+        if top_k <= 0:
+            return []
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        candidates = candidates[np.argsort(-scores[candidates],
+                                           kind='stable')]
+        return [(int(i), float(scores[i])) for i in candidates
+                if scores[i] >= min_score]
@@ -1,40 +1,54 @@
-# Класс для узла списка состояний
-class StateNode:
-    def __init__(self, state):
-        self.state = state
-        self.prev_node = None
-
-
-# Класс для односвязного списка состояний
-class StateLinkedList:
-    def __init__(self):
-        self.head = None
-
-    def add_state(self, state):
-        new_node = StateNode(state)
-        new_node.prev_node = self.head
-        self.head = new_node
-
-    def get_current_state(self):
-        if self.head:
-            return self.head.state
-        else:
-            return None
-
-    def go_back(self):
-        if self.head:
-            self.head = self.head.prev_node
-
-    def get_current_state_str(self) -> str:
-        current_state = self.get_current_state()
-        if current_state:
-            current_state_str = str(current_state)[8:-2]
-            return current_state_str
-
-    def get_state_list(self) -> list:
-        state_list = []
-        current_node = self.head
-        while current_node:
-            state_list.append(current_node.state)
-            current_node = current_node.prev_node
-        return state_list
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
+
+# Максимальная глубина истории навигации одного пользователя
+MAX_HISTORY_DEPTH = 20
+
+
+# Класс для истории состояний пользователя. История хранится в
+# FSM-хранилище отдельно для каждого чата и ограничена по глубине
+class StateHistory:
+    @staticmethod
+    def _to_str(new_state: State | str | None) -> str | None:
+        if isinstance(new_state, State):
+            return new_state.state
+        return new_state
+
+    @staticmethod
+    async def _get_history(state: FSMContext) -> list[str]:
+        data = await state.get_data()
+        return list(data.get('state_history', []))
+
+    @staticmethod
+    async def add_state(state: FSMContext, new_state: State | str) -> None:
+        history = await StateHistory._get_history(state)
+        history.append(StateHistory._to_str(new_state))
+        # Отбрасываем самые старые состояния
+        del history[:-MAX_HISTORY_DEPTH]
+        await state.update_data(state_history=history)
+
+    @staticmethod
+    async def get_current_state_str(state: FSMContext) -> str | None:
+        history = await StateHistory._get_history(state)
+        return history[-1] if history else None
+
+    # Функция, удаляющая текущее состояние из истории
+    # и возвращающая предыдущее
+    @staticmethod
+    async def go_back(state: FSMContext) -> str | None:
+        history = await StateHistory._get_history(state)
+        if history:
+            history.pop()
+        await state.update_data(state_history=history)
+        return history[-1] if history else None
+
+    # Функция, очищающая историю в начале новой сессии
+    @staticmethod
+    async def reset(state: FSMContext,
+                    new_state: State | str | None = None) -> None:
+        history = [StateHistory._to_str(new_state)] if new_state else []
+        await state.update_data(state_history=history)
+
+    @staticmethod
+    async def get_state_list(state: FSMContext) -> list[str]:
+        return list(reversed(await StateHistory._get_history(state)))
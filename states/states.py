@@ -1,7 +1,4 @@
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
-
-storage = MemoryStorage()
 
 help_state = State()
 
@@ -36,3 +33,9 @@ class FSMReviewFilmMenu(StatesGroup):
 class FSMMyFilmsMenu(StatesGroup):
     my_films = State()
     my_ratings = State()
+    search_my_films = State()
+
+
+# Группа состояний для загрузки и выгрузки библиотеки
+class FSMLibraryMenu(StatesGroup):
+    send_import_file = State()
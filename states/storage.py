@@ -0,0 +1,68 @@
+import json
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+from aiogram.fsm.storage.base import (BaseEventIsolation, BaseStorage,
+                                      StorageKey)
+from aiogram.fsm.storage.memory import MemoryStorage, SimpleEventIsolation
+
+from config_data.config import FSMStorageConfig
+
+
+# Хранилище в памяти процесса, которое хранит данные в виде JSON так же,
+# как RedisStorage. Используется локально и в тестах вместо Redis:
+# несериализуемые данные в нем приводят к ошибке сразу
+class JsonMemoryStorage(MemoryStorage):
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        await super().set_data(key, json.loads(json.dumps(data)))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return json.loads(json.dumps(await super().get_data(key)))
+
+
+# Изоляция событий в памяти процесса: апдейты одного чата обрабатываются
+# строго по очереди. В отличие от SimpleEventIsolation, блокировка чата
+# удаляется, когда апдейтов чата больше нет, поэтому память не растет
+# с количеством чатов
+class ChatEventIsolation(SimpleEventIsolation):
+    def __init__(self) -> None:
+        super().__init__()
+        self._waiters: dict[StorageKey, int] = {}
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncIterator[None]:
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            async with self._locks[key]:
+                yield
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+                del self._locks[key]
+
+
+# Функция, создающая FSM-хранилище по настройкам из конфига
+def create_storage(config: FSMStorageConfig) -> BaseStorage:
+    if config.backend == 'redis':
+        # Redis нужен только для этого бэкенда
+        from aiogram.fsm.storage.redis import DefaultKeyBuilder, RedisStorage
+
+        return RedisStorage.from_url(
+            config.redis_url,
+            key_builder=DefaultKeyBuilder(with_destiny=True),
+            state_ttl=config.state_ttl,
+            data_ttl=config.data_ttl)
+    if config.backend == 'memory':
+        return JsonMemoryStorage()
+    raise ValueError(f'Unknown FSM storage backend: {config.backend}')
+
+
+# Функция, создающая изоляцию событий для хранилища. С Redis блокировки
+# хранятся в Redis, поэтому апдейты одного чата не обрабатываются
+# параллельно и при нескольких экземплярах бота
+def create_events_isolation(config: FSMStorageConfig,
+                            storage: BaseStorage) -> BaseEventIsolation:
+    if config.backend == 'redis':
+        return storage.create_isolation()
+    return ChatEventIsolation()
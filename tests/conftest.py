@@ -0,0 +1,40 @@
+import asyncio
+import os
+import sys
+from typing import Awaitable, Callable
+
+import pytest
+
+# Модули базы данных читают настройки при импорте. Для тестов без базы
+# данных достаточно любых значений: соединение при импорте не создается
+os.environ.setdefault('DB_HOST', '127.0.0.1')
+os.environ.setdefault('DB_PORT', '5432')
+os.environ.setdefault('DB_USER', 'postgres')
+os.environ.setdefault('DB_PASS', 'postgres')
+os.environ.setdefault('DB_NAME', 'postgres')
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+# Фикстура для тестов, которым нужна PostgreSQL. Такие тесты запускаются
+# только с DB_TESTS=1 и настройками DB_* тестовой базы данных. Возвращает
+# функцию, которая выполняет корутину после применения миграций и
+# закрывает пул соединений, привязанный к циклу событий теста
+@pytest.fixture
+def run_db():
+    if os.environ.get('DB_TESTS') != '1':
+        pytest.skip('set DB_TESTS=1 to run tests against PostgreSQL')
+
+    from database.database import async_engine
+    from database.migrations import MigrationORM
+
+    def run(coro_factory: Callable[[], Awaitable]):
+        async def wrapper():
+            try:
+                await MigrationORM.migrate()
+                return await coro_factory()
+            finally:
+                await async_engine.dispose()
+        return asyncio.run(wrapper())
+    return run
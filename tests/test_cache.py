@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from services import cache as cache_module
+from services.cache import TTLCache
+
+
+# Подмена часов, время которых сдвигается вручную
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache_module.time, 'monotonic', fake)
+    return fake
+
+
+# При переполнении вытесняется самая давно использованная запись
+def test_least_recently_used_is_evicted(clock):
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+
+# Устаревшая запись не возвращается и удаляется из кэша
+def test_expired_entry_is_dropped(clock):
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    clock.now = 59
+    assert cache.get('a') == 1
+    clock.now = 61
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+# Попадания и промахи учитываются в статистике
+def test_hits_and_misses_are_counted(clock):
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.get('a')
+    cache.set('a', 1)
+    cache.get('a')
+    cache.get('a')
+    assert cache.stats() == {'hits': 2, 'misses': 1, 'size': 1,
+                             'hit_ratio': 2 / 3}
+
+
+# Одновременные запросы по одному ключу выполняют загрузку один раз
+def test_concurrent_loads_are_collapsed():
+    cache = TTLCache(maxsize=2, ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'value'
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_load('a', loader)
+                                      for _ in range(10)))
+
+    assert asyncio.run(scenario()) == ['value'] * 10
+    assert calls == [1]
+
+
+# Отмена запроса, который начал загрузку, не отменяет ожидающие
+# запросы: один из них выполняет загрузку заново
+def test_waiter_survives_cancelled_loader():
+    cache = TTLCache(maxsize=2, ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'value'
+
+    async def scenario():
+        first = asyncio.create_task(cache.get_or_load('a', loader))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(cache.get_or_load('a', loader))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(scenario()) == ('value', True)
+    assert calls == [1, 1]
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from services import film_service
+
+
+# Подмена API Википедии, которая записывает все запросы
+class FakeWikipedia:
+    def __init__(self, titles: list[str]):
+        self.titles = titles
+        self.calls: list[str] = []
+
+    async def query(self, operation: str, params: dict, timeout) -> dict:
+        self.calls.append(operation)
+        if operation == 'search':
+            return {'query': {'search': [{'title': title}
+                                         for title in self.titles]}}
+        pages = {str(i): {'title': title,
+                          'fullurl': f'https://ru.wikipedia.org/wiki/{i}'}
+                 for i, title in enumerate(params['titles'].split('|'))}
+        return {'query': {'pages': pages}}
+
+
+@pytest.fixture
+def wikipedia(monkeypatch):
+    def install(titles: list[str]) -> FakeWikipedia:
+        fake = FakeWikipedia(titles)
+        monkeypatch.setattr(film_service, '_wiki_query', fake.query)
+        return fake
+
+    async def no_local_films(query, max_results):
+        return None
+
+    monkeypatch.setattr(film_service, '_search_local_films', no_local_films)
+    film_service.search_cache.clear()
+    return install
+
+
+# Количество запросов к Википедии не зависит от количества найденных
+# фильмов: один поиск и один запрос за страницами
+@pytest.mark.parametrize('results', [1, 5, 10, 50])
+def test_search_makes_constant_number_of_requests(wikipedia, results):
+    fake = wikipedia([f'Фильм {i} (фильм, {2000 + i})'
+                      for i in range(results)])
+
+    suggestions = asyncio.run(film_service._search_films('Фильм', results))
+
+    assert len(suggestions) == results
+    assert fake.calls == ['search', 'pages']
+
+
+# Неудачный запрос за страницами не должен попадать в общий кэш
+def test_failed_page_lookup_is_not_cached(wikipedia, monkeypatch):
+    fake = wikipedia(['Фильм (фильм, 2000)'])
+
+    async def failing_query(operation, params, timeout):
+        fake.calls.append(operation)
+        return None if operation == 'pages' else await fake.query(
+            operation, params, timeout)
+
+    monkeypatch.setattr(film_service, '_wiki_query', failing_query)
+    assert asyncio.run(film_service.search_films('Фильм')) is None
+    assert len(film_service.search_cache) == 0
+
+
+# Подмена FilmORM с заранее заданными фильмами каталога
+def _catalog(monkeypatch, films: list[tuple[str, str]]) -> FakeWikipedia:
+    fake = FakeWikipedia([])
+
+    class FakeFilmORM:
+        @staticmethod
+        async def search_films(query, limit):
+            return [(title, link, 0.5) for title, link in films]
+
+    monkeypatch.setattr(film_service, '_wiki_query', fake.query)
+    monkeypatch.setattr(film_service, 'FilmORM', FakeFilmORM)
+    return fake
+
+
+# Фильм из локального каталога находится без запросов к Википедии,
+# даже если его название содержит уточнение в скобках. Похожие фильмы,
+# не прошедшие порог схожести, в предложения не попадают
+def test_catalog_match_skips_wikipedia(monkeypatch):
+    link = 'https://ru.wikipedia.org/wiki/1'
+    fake = _catalog(monkeypatch, [
+        ('Интерстеллар (фильм)', link),
+        ('Интерстелларные войны', 'https://ru.wikipedia.org/wiki/2')])
+
+    suggestions = asyncio.run(film_service._search_films('интерстеллар', 10))
+
+    assert suggestions == {'Интерстеллар (фильм)': link}
+    assert fake.calls == []
+
+
+# Фильм каталога со ссылкой не на Википедию не заменяет поиск
+def test_catalog_film_with_foreign_link_is_ignored(monkeypatch):
+    fake = _catalog(monkeypatch, [
+        ('Интерстеллар', 'https://example.com/interstellar')])
+
+    asyncio.run(film_service._search_films('интерстеллар', 10))
+
+    assert fake.calls == ['search']
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from services import library_io
+from services.library_io import import_library
+
+WIKI_LINK = 'https://ru.wikipedia.org/wiki/%D0%A4%D0%B8%D0%BB%D1%8C%D0%BC'
+
+
+# Подмена ORM, которая запоминает добавленные фильмы и оценки
+class FakeLibraryORM:
+    def __init__(self):
+        self.films: dict[str, int] = {}
+        self.ratings: list[tuple[int, int, int]] = []
+
+    async def get_or_create_films(self, films):
+        for _, wiki_link in films:
+            self.films.setdefault(wiki_link, len(self.films) + 1)
+        return dict(self.films)
+
+    async def copy_ratings(self, ratings):
+        self.ratings.extend(ratings)
+
+    async def copy_reviews(self, reviews):
+        pass
+
+
+@pytest.fixture
+def orm(monkeypatch):
+    fake = FakeLibraryORM()
+    for name in ('FilmORM', 'RatingORM', 'ReviewORM'):
+        monkeypatch.setattr(library_io, name, fake)
+    return fake
+
+
+async def _chunks(text: str):
+    yield text.encode('utf-8')
+
+
+def _import(text: str):
+    return asyncio.run(import_library(1, _chunks(text), 'csv'))
+
+
+# В общий каталог попадают только ссылки на страницы Википедии,
+# приведенные к виду, в котором их возвращает API
+def test_only_wikipedia_links_are_imported(orm):
+    result = _import('title,wiki_link,rating\n'
+                     'Фильм,https://ru.wikipedia.org/wiki/Фильм,7\n'
+                     'Фишинг,https://example.com/wiki/Фильм,7\n'
+                     'Не ссылка,фильм,7\n')
+
+    assert list(orm.films) == [WIKI_LINK]
+    assert result.ratings == 1
+    assert result.skipped == 2
+
+
+# Повторы фильма в файле считаются одной загруженной оценкой
+def test_duplicate_ratings_are_counted_once(orm):
+    result = _import('title,wiki_link,rating\n'
+                     f'Фильм,{WIKI_LINK},3\n'
+                     f'Фильм,{WIKI_LINK},8\n')
+
+    assert result.ratings == 1
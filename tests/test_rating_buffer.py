@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from services import rating_buffer as rating_buffer_module
+from services.rating_buffer import RatingWriteBuffer
+
+
+# Подмена RatingORM, которая записывает оценки в словарь
+class FakeRatingORM:
+    def __init__(self):
+        self.ratings: dict[tuple[int, int], int] = {}
+        self.batches: list[int] = []
+        # Фильмы, оценки которых база данных не принимает
+        self.bad_films: set[int] = set()
+        self.unavailable = False
+
+    def _check(self, film_id: int) -> None:
+        if self.unavailable:
+            raise OSError('database is unavailable')
+        if film_id in self.bad_films:
+            raise IntegrityError('INSERT', {}, Exception('fk violation'))
+
+    async def set_ratings(self, ratings: list[tuple[int, int, int]]) -> None:
+        await asyncio.sleep(0)
+        self.batches.append(len(ratings))
+        for _, film_id, _ in ratings:
+            self._check(film_id)
+        for user_id, film_id, rating in ratings:
+            self.ratings[(user_id, film_id)] = rating
+
+    async def set_or_update_rating(self, user_id: int, film_id: int,
+                                   new_rating: int) -> int:
+        self._check(film_id)
+        self.ratings[(user_id, film_id)] = new_rating
+        return 1
+
+
+@pytest.fixture
+def orm(monkeypatch):
+    fake = FakeRatingORM()
+    monkeypatch.setattr(rating_buffer_module, 'RatingORM', fake)
+    return fake
+
+
+# Пока идет запись по заполнению буфера, новая не запускается
+def test_one_size_triggered_flush_at_a_time(orm):
+    async def scenario():
+        buffer = RatingWriteBuffer(max_size=10)
+        flushes = []
+        safe_flush = buffer._safe_flush
+
+        async def counting_flush():
+            flushes.append(len(buffer._pending))
+            await safe_flush()
+
+        buffer._safe_flush = counting_flush
+        for film_id in range(50):
+            await buffer.add(1, film_id, 5)
+        await buffer._size_flush
+        return flushes
+
+    assert asyncio.run(scenario()) == [50]
+    assert len(orm.ratings) == 50
+
+
+# Оценки без пользователя в буфер не попадают
+def test_rating_without_user_is_skipped(orm):
+    async def scenario():
+        buffer = RatingWriteBuffer()
+        await buffer.add(None, 1, 5)
+        await buffer.flush()
+
+    asyncio.run(scenario())
+    assert orm.batches == []
+
+
+# Если пачка не записалась из-за одной оценки, остальные
+# записываются по одной, а некорректная отбрасывается
+def test_bad_rating_does_not_block_batch(orm):
+    async def scenario():
+        buffer = RatingWriteBuffer()
+        orm.bad_films.add(2)
+        for film_id in range(1, 4):
+            await buffer.add(1, film_id, 7)
+        await buffer.flush()
+        return buffer._pending
+
+    assert asyncio.run(scenario()) == {}
+    assert orm.ratings == {(1, 1): 7, (1, 3): 7}
+
+
+# Пока база данных недоступна, буфер не растет больше max_pending
+def test_buffer_is_capped(orm):
+    async def scenario():
+        buffer = RatingWriteBuffer(max_size=100, max_pending=20)
+        orm.unavailable = True
+        for film_id in range(20):
+            await buffer.add(1, film_id, 5)
+        with pytest.raises(OSError):
+            await buffer.add(1, 100, 5)
+        pending = len(buffer._pending)
+        orm.unavailable = False
+        await buffer.add(1, 100, 5)
+        return pending, len(buffer._pending)
+
+    assert asyncio.run(scenario()) == (20, 1)
+    assert len(orm.ratings) == 20
+
+
+# При подтверждении оценки записываются только оценки этого пользователя
+def test_flush_user_keeps_other_users_pending(orm):
+    async def scenario():
+        buffer = RatingWriteBuffer()
+        await buffer.add(1, 1, 7)
+        await buffer.add(1, 2, 8)
+        await buffer.add(2, 1, 5)
+        await buffer.flush_user(1)
+        return buffer._pending
+
+    assert asyncio.run(scenario()) == {(2, 1): 5}
+    assert orm.ratings == {(1, 1): 7, (1, 2): 8}
+    assert orm.batches == [2]
@@ -0,0 +1,83 @@
+import asyncio
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.filters import StateFilter
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup, default_state
+from aiogram.types import Message
+
+from middlewares.scheduler import DROPPED_UPDATE_TEXT, UpdateSchedulerMiddleware
+from states.storage import ChatEventIsolation, JsonMemoryStorage
+
+
+class FSMTest(StatesGroup):
+    second = State()
+
+
+def _message_update(update_id: int, chat_id: int) -> dict:
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': 0, 'text': 'test',
+        'chat': {'id': chat_id, 'type': 'private'},
+        'from': {'id': chat_id, 'is_bot': False, 'first_name': 'User'}}}
+
+
+# Диспетчер с тем же порядком middleware, что и в bot.py
+def _create_dispatcher(
+        handled: list[str],
+        max_pending: int) -> tuple[Dispatcher, ChatEventIsolation]:
+    isolation = ChatEventIsolation()
+    dp = Dispatcher(storage=JsonMemoryStorage(), events_isolation=isolation,
+                    disable_fsm=True)
+    scheduler = UpdateSchedulerMiddleware(max_concurrency=10,
+                                          max_pending=max_pending)
+    dp.update.outer_middleware(scheduler)
+    dp.update.outer_middleware(dp.fsm)
+    dp.update.outer_middleware(scheduler.limit)
+
+    router = Router()
+
+    @router.message(StateFilter(default_state))
+    async def first(message: Message, state: FSMContext):
+        await asyncio.sleep(0.05)
+        await state.set_state(FSMTest.second)
+        handled.append('first')
+
+    @router.message(StateFilter(FSMTest.second))
+    async def second(message: Message, state: FSMContext):
+        handled.append('second')
+
+    dp.include_router(router)
+    return dp, isolation
+
+
+async def _feed(dp: Dispatcher, *updates: dict) -> None:
+    bot = Bot(token='42:TEST')
+    await asyncio.gather(*(dp.feed_raw_update(bot, update)
+                           for update in updates))
+
+
+# Апдейт, пришедший во время обработки предыдущего апдейта чата,
+# видит состояние, которое установил предыдущий хэндлер
+def test_queued_update_sees_new_state():
+    handled: list[str] = []
+    dp, isolation = _create_dispatcher(handled, max_pending=10)
+    asyncio.run(_feed(dp, _message_update(1, 7), _message_update(2, 7)))
+    assert handled == ['first', 'second']
+    # Блокировки чатов удаляются после обработки
+    assert not isolation._locks
+
+
+# Апдейты сверх max_pending отбрасываются, а на отброшенное
+# сообщение бот отвечает, что перегружен
+def test_updates_over_limit_are_dropped(monkeypatch):
+    replies: list[tuple[int, str]] = []
+
+    async def answer(message: Message, text: str, **kwargs):
+        replies.append((message.chat.id, text))
+
+    monkeypatch.setattr(Message, 'answer', answer)
+    handled: list[str] = []
+    dp, _ = _create_dispatcher(handled, max_pending=1)
+    asyncio.run(_feed(dp, _message_update(1, 7), _message_update(2, 8)))
+    assert handled == ['first']
+    assert replies == [(8, DROPPED_UPDATE_TEXT)]
@@ -0,0 +1,18 @@
+from services.similarity import TitleMatcher
+
+
+# Названия возвращаются по убыванию схожести, не больше top_k
+# и не ниже min_score
+def test_top_ranks_and_filters_titles():
+    matcher = TitleMatcher(['Солярис', 'Сталкер', 'Солярис', 'Зеркало'])
+
+    top = matcher.top('солярис', top_k=3, min_score=0.5)
+
+    assert [index for index, _ in top] == [0, 2]
+    assert all(score == 1.0 for _, score in top)
+
+
+# Запрос без общих n-грамм и пустой список не ломают поиск
+def test_top_without_matches():
+    assert TitleMatcher(['Сталкер']).top('xyz', min_score=0.1) == []
+    assert TitleMatcher([]).top('Сталкер') == []
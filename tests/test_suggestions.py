@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import AnswerCallbackQuery, EditMessageText, SendMessage
+from aiogram.types import Chat, Message
+
+from handlers import user_handlers
+from keyboards.callback_data import SuggestionCallback
+from states.state_management import StateHistory
+from states.states import FSMRateFilmMenu
+from states.storage import JsonMemoryStorage
+
+CHAT_ID = 7
+SUGGESTIONS = {
+    'Солярис': {'Солярис (фильм, 1972)': 'https://example.com/1972',
+                'Солярис (фильм, 2002)': 'https://example.com/2002'},
+    'Сталкер': {'Сталкер (фильм)': 'https://example.com/stalker'},
+}
+
+
+# Подмена Bot API, которая записывает все запросы бота
+class FakeSession(BaseSession):
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests.append(method)
+        if isinstance(method, (SendMessage, EditMessageText)):
+            return Message(message_id=1, date=0, text=method.text,
+                           chat=Chat(id=CHAT_ID, type='private'))
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+def _user() -> dict:
+    return {'id': CHAT_ID, 'is_bot': False, 'first_name': 'User'}
+
+
+def _message(update_id: int, text: str) -> dict:
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': 0, 'text': text,
+        'chat': {'id': CHAT_ID, 'type': 'private'}, 'from': _user()}}
+
+
+def _callback(update_id: int, data: str) -> dict:
+    return {'update_id': update_id, 'callback_query': {
+        'id': str(update_id), 'from': _user(), 'chat_instance': '1',
+        'data': data, 'message': {
+            'message_id': 1, 'date': 1, 'text': 'Выберите фильм',
+            'chat': {'id': CHAT_ID, 'type': 'private'}}}}
+
+
+# Роутер можно подключить только к одному диспетчеру
+@pytest.fixture(scope='module')
+def dispatcher():
+    dp = Dispatcher(storage=JsonMemoryStorage())
+    dp.include_router(user_handlers.router)
+    return dp
+
+
+@pytest.fixture
+def search(monkeypatch):
+    async def fake_search_films(query: str):
+        return SUGGESTIONS.get(query)
+
+    monkeypatch.setattr(user_handlers, 'search_films', fake_search_films)
+
+
+# Нажатие на кнопку под ответом на прошлый запрос отклоняется,
+# а кнопка под ответом на последний запрос выбирает фильм из него
+def test_stale_suggestion_tap_is_rejected(dispatcher, search):
+    async def scenario():
+        session = FakeSession()
+        bot = Bot(token='42:TEST', session=session)
+        state = dispatcher.fsm.get_context(bot, chat_id=CHAT_ID,
+                                           user_id=CHAT_ID)
+        await state.set_state(FSMRateFilmMenu.send_title)
+        await state.update_data(send_title={'message_data': {
+            'text': 'Отправьте название', 'reply_markup': 'navigation'}})
+        await StateHistory.add_state(state, FSMRateFilmMenu.send_title)
+
+        await dispatcher.feed_raw_update(bot, _message(1, 'Солярис'))
+        old_tap = session.requests[-1].reply_markup.inline_keyboard[0][0]
+        await dispatcher.feed_raw_update(bot, _callback(2, 'return'))
+        await dispatcher.feed_raw_update(bot, _message(3, 'Сталкер'))
+        new_tap = session.requests[-1].reply_markup.inline_keyboard[0][0]
+
+        await dispatcher.feed_raw_update(
+            bot, _callback(4, old_tap.callback_data))
+        stale_answer = session.requests[-1]
+        stale_state = await state.get_state()
+
+        await dispatcher.feed_raw_update(
+            bot, _callback(5, new_tap.callback_data))
+        return (old_tap, new_tap, stale_answer, stale_state,
+                await state.get_state(), await state.get_data())
+
+    old_tap, new_tap, stale_answer, stale_state, new_state, data = (
+        asyncio.run(scenario()))
+    assert (SuggestionCallback.unpack(old_tap.callback_data).token
+            != SuggestionCallback.unpack(new_tap.callback_data).token)
+    assert isinstance(stale_answer, AnswerCallbackQuery)
+    assert stale_answer.text
+    assert stale_state == FSMRateFilmMenu.select_suggestion.state
+    assert new_state == FSMRateFilmMenu.send_rating.state
+    assert data['send_rating']['film_data'] == {
+        'title': 'Сталкер (фильм)', 'wiki_link': 'https://example.com/stalker'}
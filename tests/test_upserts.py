@@ -0,0 +1,113 @@
+import asyncio
+import random
+import uuid
+
+from sqlalchemy import delete, func, select
+
+from database.database import session_factory
+from database.models import Film, Rating, User
+from database.orm import FilmORM, RatingORM, UserORM
+
+# Количество одновременных нажатий в стресс-тесте
+CLICKS = 1000
+
+
+async def _count(stmt) -> int:
+    async with session_factory() as session:
+        return await session.scalar(stmt)
+
+
+async def _create_user_and_film() -> tuple[int, int, int]:
+    tg_id = random.randint(10 ** 12, 10 ** 13)
+    user_id = await UserORM.set_user(tg_id, 'stress test')
+    film_id = await FilmORM.get_or_create_film(
+        'Stress test', f'https://example.com/{uuid.uuid4()}')
+    return tg_id, user_id, film_id
+
+
+async def _cleanup(user_id: int, film_id: int) -> None:
+    async with session_factory() as session:
+        await session.execute(delete(Rating).filter_by(user_id=user_id))
+        await session.execute(delete(Film).filter_by(id=film_id))
+        await session.execute(delete(User).filter_by(id=user_id))
+        await session.commit()
+
+
+# 1000 одновременных оценок одного фильма одним пользователем
+# оставляют ровно одну строку с одной из отправленных оценок
+def test_parallel_rating_clicks_create_one_row(run_db):
+    async def scenario():
+        _, user_id, film_id = await _create_user_and_film()
+        try:
+            rating_ids = await asyncio.gather(*(
+                RatingORM.set_or_update_rating(user_id, film_id, i % 11)
+                for i in range(CLICKS)))
+            rows = await _count(
+                select(func.count()).select_from(Rating)
+                .filter_by(user_id=user_id, film_id=film_id))
+            return set(rating_ids), rows
+        finally:
+            await _cleanup(user_id, film_id)
+
+    rating_ids, rows = run_db(scenario)
+    assert rows == 1
+    assert len(rating_ids) == 1
+
+
+# Одновременные /start и добавление одного фильма не создают дубликатов
+def test_parallel_user_and_film_upserts(run_db):
+    async def scenario():
+        tg_id, user_id, film_id = await _create_user_and_film()
+        wiki_link = (await FilmORM.get_film(film_id)).wiki_link
+        try:
+            user_ids = await asyncio.gather(*(
+                UserORM.set_user(tg_id, f'name {i}') for i in range(CLICKS)))
+            film_ids = await asyncio.gather(*(
+                FilmORM.get_or_create_film('Stress test', wiki_link)
+                for _ in range(CLICKS)))
+            users = await _count(
+                select(func.count()).select_from(User).filter_by(tg_id=tg_id))
+            films = await _count(
+                select(func.count()).select_from(Film)
+                .filter_by(wiki_link=wiki_link))
+            return set(user_ids), set(film_ids), users, films, user_id, film_id
+        finally:
+            await _cleanup(user_id, film_id)
+
+    user_ids, film_ids, users, films, user_id, film_id = run_db(scenario)
+    assert user_ids == {user_id} and users == 1
+    assert film_ids == {film_id} and films == 1
+
+
+# Если фильм повторяется в загружаемом файле, остается последняя оценка
+def test_copy_ratings_keeps_last_duplicate(run_db):
+    async def scenario():
+        _, user_id, film_id = await _create_user_and_film()
+        try:
+            await RatingORM.copy_ratings(
+                [(user_id, film_id, score) for score in (2, 9, 4)])
+            return await _count(
+                select(Rating.rating).filter_by(user_id=user_id,
+                                                film_id=film_id))
+        finally:
+            await _cleanup(user_id, film_id)
+
+    assert run_db(scenario) == 4
+
+
+# Импорт не переименовывает фильмы, которые уже есть в каталоге
+def test_import_does_not_rename_films(run_db):
+    async def scenario():
+        _, user_id, film_id = await _create_user_and_film()
+        wiki_link = (await FilmORM.get_film(film_id)).wiki_link
+        try:
+            film_ids = await FilmORM.get_or_create_films(
+                [('Renamed by import', wiki_link)])
+            title = await _count(select(Film.title).filter_by(id=film_id))
+            return film_ids, title, wiki_link, film_id
+        finally:
+            await _cleanup(user_id, film_id)
+
+    film_ids, title, wiki_link, film_id = run_db(scenario)
+    assert film_ids == {wiki_link: film_id}
+    assert title == 'Stress test'
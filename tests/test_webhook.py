@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiohttp.test_utils import TestClient, TestServer
+
+from config_data.config import WebhookConfig, load_config
+from webhook.webhook import create_app
+
+
+def _webhook_config(**kwargs) -> WebhookConfig:
+    values = dict(enabled=True, base_url='https://example.com',
+                  path='/webhook', secret='secret', host='127.0.0.1',
+                  port=8080, max_connections=40, max_in_flight=0)
+    values.update(kwargs)
+    return WebhookConfig(**values)
+
+
+# Проверка работоспособности отвечает, даже когда лимит запросов исчерпан
+def test_health_is_not_limited():
+    async def scenario():
+        app = create_app(Dispatcher(), Bot(token='42:TEST'),
+                         _webhook_config())
+        async with TestClient(TestServer(app)) as client:
+            health = await client.get('/health')
+            webhook = await client.post('/webhook', json={})
+            return health.status, webhook.status
+
+    assert asyncio.run(scenario()) == (200, 503)
+
+
+# Режим вебхука без адреса или секрета не запускается
+@pytest.mark.parametrize('missing', ['WEBHOOK_BASE_URL', 'WEBHOOK_SECRET'])
+def test_webhook_mode_requires_url_and_secret(monkeypatch, missing):
+    monkeypatch.setenv('BOT_TOKEN', '42:TEST')
+    monkeypatch.setenv('BOT_MODE', 'webhook')
+    monkeypatch.setenv('WEBHOOK_BASE_URL', 'https://example.com')
+    monkeypatch.setenv('WEBHOOK_SECRET', 'secret')
+    monkeypatch.setenv(missing, '')
+    with pytest.raises(ValueError, match=missing):
+        load_config('/nonexistent.env')
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import signal
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import (SimpleRequestHandler,
+                                            setup_application)
+from aiohttp import web
+
+from config_data.config import WebhookConfig
+
+logger = logging.getLogger(__name__)
+
+
+# Функция, создающая middleware, которое ограничивает количество
+# одновременно обрабатываемых запросов с апдейтами. При превышении лимита
+# Telegram получает 503 и повторит доставку апдейта позже. Остальные
+# запросы, например проверка работоспособности, лимит не учитывает
+def _create_limit_middleware(max_in_flight: int, path: str):
+    in_flight = 0
+
+    @web.middleware
+    async def limit_middleware(request: web.Request, handler):
+        nonlocal in_flight
+        if request.path != path:
+            return await handler(request)
+        if in_flight >= max_in_flight:
+            return web.Response(status=503, headers={'Retry-After': '1'})
+        in_flight += 1
+        try:
+            return await handler(request)
+        finally:
+            in_flight -= 1
+
+    return limit_middleware
+
+
+# Хэндлер для проверки работоспособности сервера
+async def health_handler(request: web.Request) -> web.Response:
+    return web.json_response({'status': 'ok'})
+
+
+# Функция, создающая aiohttp-приложение для приема апдейтов
+def create_app(dp: Dispatcher, bot: Bot,
+               config: WebhookConfig) -> web.Application:
+    app = web.Application(
+        middlewares=[_create_limit_middleware(config.max_in_flight,
+                                              config.path)])
+    app.router.add_get('/health', health_handler)
+
+    # Апдейт обрабатывается до ответа Telegram, поэтому лимит
+    # одновременных запросов ограничивает и количество обработчиков
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=config.secret,
+        handle_in_background=False
+    ).register(app, path=config.path)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+# Функция, запускающая бота в режиме вебхука и ожидающая сигнала остановки.
+# Реплик может быть несколько, но буфер оценок у каждой свой
+# (см. services/rating_buffer.py)
+async def run_webhook(dp: Dispatcher, bot: Bot,
+                      config: WebhookConfig) -> None:
+    app = create_app(dp, bot, config)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=config.host, port=config.port)
+    await site.start()
+    logger.info('Webhook server started on %s:%d', config.host, config.port)
+
+    await bot.set_webhook(
+        url=f'{config.base_url}{config.path}',
+        secret_token=config.secret,
+        max_connections=config.max_connections,
+        allowed_updates=dp.resolve_used_update_types())
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    try:
+        await stop_event.wait()
+    finally:
+        logger.info('Stopping webhook server')
+        # Вебхук общий для всех реплик, поэтому при остановке он не
+        # удаляется: апдейты продолжают получать остальные реплики
+        # Дожидаемся обработки принятых запросов и вызываем
+        # хэндлеры остановки диспетчера
+        await runner.cleanup()